@@ -1,177 +1,279 @@
-from flask import Flask, request, Response, jsonify
+from flask import Flask, request, Response, jsonify, stream_with_context
 import logging
+import os
+import threading
+import time
+import orjson
 from services.search_service import SearchService
 from services.xml_service import XMLService
 from utils.query_processor import QueryProcessor
+from utils.response_cache import ResponseCache
 
 app = Flask(__name__)
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# Set up logging; debug output (full upstream responses, per-torrent decisions)
+# costs real time per request, so it's opt-in with LOG_LEVEL=DEBUG
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 # Initialize services
 search_service = SearchService()
 xml_service = XMLService()
 query_processor = QueryProcessor()
+response_cache = ResponseCache()
 
-@app.route('/api')
-def api():
-    t = request.args.get('t', '').lower()
-    logger.debug(f"API request: {request.args}")
+# Services above are built once at import so gunicorn --preload shares them
+# across workers; anything that can't cross a fork is started per worker below.
+# The price is that everything they hold (caches, the mapping index, update
+# timers) is per worker after the fork; _sync_worker keeps admin actions consistent
+_worker_init_lock = threading.Lock()
+_worker_initialized = False
+
+@app.before_request
+def _init_worker():
+    """One-shot per-process setup for state that doesn't survive fork"""
+    global _worker_initialized
+    if _worker_initialized:
+        return
+    with _worker_init_lock:
+        if not _worker_initialized:
+            search_service.mapping_service.start_auto_updates()
+            _worker_initialized = True
+
+# Each worker keeps its own caches and mapping index, so admin actions taken in
+# one worker are passed on through files every worker can see: a rewritten
+# mapping file, and this marker which /cache/flush touches
+_CACHE_FLUSH_MARKER = os.getenv('CACHE_FLUSH_MARKER', 'cache.flush')
+# How often each worker checks for them, in seconds
+_SYNC_INTERVAL = 1.0
+_sync_lock = threading.Lock()
+_next_sync = 0.0
+
+def _flush_marker_mtime():
+    """Modification time of the flush marker in ns, or None before the first flush"""
+    try:
+        return os.stat(_CACHE_FLUSH_MARKER).st_mtime_ns
+    except OSError:
+        return None
+
+_flush_seen = _flush_marker_mtime()
+
+def _clear_caches():
+    """Drop this worker's cached AniList lookups, Nyaa metadata and /api responses"""
+    return (search_service.anilist_service.clear_cache(), xml_service.nyaa_service.clear_cache(),
+            response_cache.clear())
+
+@app.before_request
+def _sync_worker():
+    """Catch up with mapping reloads and cache flushes done by other workers"""
+    global _next_sync, _flush_seen
+    if time.monotonic() < _next_sync or not _sync_lock.acquire(blocking=False):
+        return
+    try:
+        _next_sync = time.monotonic() + _SYNC_INTERVAL
+        search_service.mapping_service.reload_if_changed()
+        flushed = _flush_marker_mtime()
+        if flushed != _flush_seen:
+            _flush_seen = flushed
+            logger.info("Cache flush requested by another worker, clearing caches")
+            _clear_caches()
+    finally:
+        _sync_lock.release()
+
+_EMPTY_JSON = orjson.dumps({"usenetReleases": [], "torrentReleases": []})
+
+# Empty results are also what failed upstream calls produce, so they're only
+# cached (and advertised as cacheable) briefly
+_EMPTY_RESPONSE_MAX_AGE = 60
+
+# Requested category -> whether to force the Anime category in the feed
+_FORCE_ANIME_BY_CAT = {'5000': True, '2000': False}
+
+def _parse_int_arg(args, name):
+    """Parse an optional non-negative integer query argument, ignoring junk values"""
+    value = args.get(name)
+    # isdecimal() accepts exactly the digits int() does, so junk never raises
+    return int(value) if value and value.isdecimal() else None
 
-    if t == 'caps':
-        return Response(xml_service.build_caps_xml(), mimetype='application/xml')
+def _empty_rss_response(processed_query):
+    """Empty but valid RSS instead of an error, for Prowlarr compatibility"""
+    response = Response(xml_service.build_empty_rss("SeadexNab - No Results", 
+                                                    f"No results found for: {processed_query}"), 
+                        mimetype='application/xml', direct_passthrough=True)
+    response.cache_control.max_age = _EMPTY_RESPONSE_MAX_AGE
+    return response
 
-    elif t == 'search':
-        query_param = request.args.get('q', '')
-        return_type = request.args.get('response', 'xml')
-        cat = request.args.get('cat', '')
-        
-        # Handle empty searches based on category
-        if not query_param or query_param.strip() == '':
-            if cat == '2000':  # Movie category
-                query_param = 'Akira'  # Default to a popular anime movie
-                logger.info("Empty movie category search, defaulting to 'Akira'")
-            else:  # TV or general
-                query_param = 'given'  # Default to a popular TV anime
-                logger.info("Empty search query, defaulting to 'given'")
-        
+def _handle_caps(args):
+    return Response(xml_service.build_caps_xml(), mimetype='application/xml', direct_passthrough=True)
+
+def _handle_search(args):
+    query_param = args.get('q', '')
+    return_type = args.get('response', 'xml')
+    cat = args.get('cat', '')
+    
+    # Handle empty searches based on category
+    if not query_param or query_param.strip() == '':
+        if cat == '2000':  # Movie category
+            query_param = 'Akira'  # Default to a popular anime movie
+            logger.info("Empty movie category search, defaulting to 'Akira'")
+        else:  # TV or general
+            query_param = 'given'  # Default to a popular TV anime
+            logger.info("Empty search query, defaulting to 'given'")
+        # The defaults are already clean titles
+        processed_query = query_param
+    else:
         processed_query = query_processor.process_search_query(query_param)
-        logger.info(f"Processed search query: '{processed_query}' (original: '{query_param}', cat: {cat})")
-        
-        # Perform search with enhanced movie support
-        # Use search_type based on category if specified
-        search_type = "ANIME"
-        if cat == '2000':
-            # Hint that we're looking for movies
-            search_type = "ANIME"  # Still use ANIME but the category will influence results
-        
-        result = search_service.perform_search(processed_query, search_type=search_type)
-        
-        # Handle the 5-tuple return value
-        if len(result) == 5:
-            anilist_id, anime_name, processed_torrents, anime_format, year = result
-        else:
-            anilist_id, anime_name, processed_torrents = result
-            anime_format = None
-            year = None
-        
-        if not anilist_id or not processed_torrents:
-            if return_type == 'json':
-                return Response('{"usenetReleases": [], "torrentReleases": []}', 
-                              mimetype='application/json', status=404)
-            else:
-                return Response(xml_service.build_empty_rss("SeadexNab - No Results", 
-                                              f"No results found for: {processed_query}"), 
-                              mimetype='application/xml')
-        
+    logger.info(f"Processed search query: '{processed_query}' (original: '{query_param}', cat: {cat})")
+    
+    # Perform search with enhanced movie support
+    # Use search_type based on category if specified
+    search_type = "ANIME"
+    if cat == '2000':
+        # Hint that we're looking for movies
+        search_type = "ANIME"  # Still use ANIME but the category will influence results
+    
+    anilist_id, anime_name, processed_torrents, anime_format, year = search_service.perform_search(processed_query, search_type=search_type)
+    
+    if not anilist_id or not processed_torrents:
         if return_type == 'json':
-            json_response = {
-                "usenetReleases": [],
-                "torrentReleases": [{"title": t.get("title", ""), "url": t.get("url", "")} for t in processed_torrents]
-            }
-            return Response(str(json_response), mimetype='application/json')
-        else:
-            # Determine if we should force anime category based on the category filter
-            force_anime = False
-            if cat == '5000':  # TV category requested
-                force_anime = True
-            elif cat == '2000':  # Movie category requested
-                force_anime = False
-            else:
-                # No specific category, use format to decide
-                force_anime = anime_format != 'MOVIE'
-            
-            xml = xml_service.build_rss_enhanced(anilist_id, anime_name, processed_torrents, 
+            response = Response(_EMPTY_JSON, mimetype='application/json', status=404)
+            response.cache_control.max_age = _EMPTY_RESPONSE_MAX_AGE
+            return response
+        return _empty_rss_response(processed_query)
+    
+    if return_type == 'json':
+        json_response = orjson.dumps({
+            "usenetReleases": [],
+            "torrentReleases": [{"title": torrent.get("title", ""), "url": torrent.get("url", "")}
+                                for torrent in processed_torrents]
+        })
+        return Response(json_response, mimetype='application/json')
+    
+    # Force the anime category for TV (5000) but not movie (2000) requests;
+    # with no specific category, use format to decide
+    force_anime = _FORCE_ANIME_BY_CAT.get(cat, anime_format != 'MOVIE')
+    
+    xml = xml_service.build_rss_enhanced_stream(anilist_id, anime_name, processed_torrents, 
                                                 anime_format=anime_format, year=year,
                                                 force_anime_category=force_anime)
-            return Response(xml, mimetype='application/xml')
+    return Response(stream_with_context(xml), mimetype='application/xml')
 
-    elif t == 'tvsearch':
-        query_param = request.args.get('q', '')
-        season = request.args.get('season')
-        episode = request.args.get('ep')
-        
-        # Handle empty searches with a default popular anime
-        if not query_param or query_param.strip() == '':
-            query_param = 'given'  # Default to a popular TV anime
-            logger.info("Empty TV search query, defaulting to 'given'")
-        
-        try:
-            season = int(season) if season else None
-        except ValueError:
-            season = None
-            
-        try:
-            episode = int(episode) if episode else None
-        except ValueError:
-            episode = None
-        
-        processed_query = query_processor.process_search_query(query_param, season, episode)
-        logger.info(f"TV search for: '{processed_query}' (season={season}, episode={episode})")
-        
-        result = search_service.perform_search(processed_query, season, episode)
-        
-        # Handle the 5-tuple return value
-        if len(result) == 5:
-            anilist_id, anime_name, processed_torrents, anime_format, year = result
-        else:
-            anilist_id, anime_name, processed_torrents = result
-            anime_format = None
-            year = None
-        
-        if not anilist_id or not processed_torrents:
-            # Return empty but valid RSS instead of error for Prowlarr compatibility
-            return Response(xml_service.build_empty_rss("SeadexNab - No Results", 
-                                          f"No results found for: {processed_query}"), 
-                          mimetype='application/xml')
-        
-        # Force anime category (5000) for Sonarr compatibility
-        xml = xml_service.build_rss_enhanced(anilist_id, anime_name, processed_torrents, 
-                                            season, episode, anime_format, year, 
-                                            force_anime_category=True)
-        return Response(xml, mimetype='application/xml')
+def _handle_tv(args):
+    query_param = args.get('q', '')
+    
+    # Handle empty searches with a default popular anime
+    if not query_param or query_param.strip() == '':
+        query_param = 'given'  # Default to a popular TV anime
+        logger.info("Empty TV search query, defaulting to 'given'")
+    
+    season = _parse_int_arg(args, 'season')
+    episode = _parse_int_arg(args, 'ep')
+    
+    processed_query = query_processor.process_search_query(query_param, season, episode)
+    logger.info(f"TV search for: '{processed_query}' (season={season}, episode={episode})")
+    
+    anilist_id, anime_name, processed_torrents, anime_format, year = search_service.perform_search(processed_query, season, episode)
+    
+    if not anilist_id or not processed_torrents:
+        return _empty_rss_response(processed_query)
+    
+    # Force anime category (5000) for Sonarr compatibility
+    xml = xml_service.build_rss_enhanced_stream(anilist_id, anime_name, processed_torrents, 
+                                                season, episode, anime_format, year, 
+                                                force_anime_category=True)
+    return Response(stream_with_context(xml), mimetype='application/xml')
 
-    elif t == 'movie':
-        query_param = request.args.get('q', '')
-        
-        # Handle empty searches with a default popular movie
-        if not query_param or query_param.strip() == '':
-            query_param = 'Spirited Away'  # Default to a popular anime movie
-            logger.info("Empty movie search query, defaulting to 'Spirited Away'")
-        
-        processed_query = query_processor.process_search_query(query_param)
-        logger.info(f"Movie search for: '{processed_query}'")
-        
-        result = search_service.perform_search(processed_query, search_type="ANIME")
-        
-        # Handle the 5-tuple return value
-        if len(result) == 5:
-            anilist_id, anime_name, processed_torrents, anime_format, year = result
-        else:
-            anilist_id, anime_name, processed_torrents = result
-            anime_format = None
-            year = None
-        
-        if not anilist_id or not processed_torrents:
-            return Response(xml_service.build_empty_rss("SeadexNab - No Results", 
-                                          f"No results found for: {processed_query}"), 
-                          mimetype='application/xml')
-        
-        # Use movie category (2000) for Radarr compatibility
-        xml = xml_service.build_rss_enhanced(anilist_id, anime_name, processed_torrents, 
-                                            anime_format=anime_format, year=year, 
-                                            force_anime_category=False)
-        return Response(xml, mimetype='application/xml')
+def _handle_movie(args):
+    query_param = args.get('q', '')
+    
+    # Handle empty searches with a default popular movie
+    if not query_param or query_param.strip() == '':
+        query_param = 'Spirited Away'  # Default to a popular anime movie
+        logger.info("Empty movie search query, defaulting to 'Spirited Away'")
+    
+    processed_query = query_processor.process_search_query(query_param)
+    logger.info(f"Movie search for: '{processed_query}'")
+    
+    anilist_id, anime_name, processed_torrents, anime_format, year = search_service.perform_search(processed_query, search_type="ANIME")
+    
+    if not anilist_id or not processed_torrents:
+        return _empty_rss_response(processed_query)
+    
+    # Use movie category (2000) for Radarr compatibility
+    xml = xml_service.build_rss_enhanced_stream(anilist_id, anime_name, processed_torrents, 
+                                                anime_format=anime_format, year=year, 
+                                                force_anime_category=False)
+    return Response(stream_with_context(xml), mimetype='application/xml')
 
-    else:
+# Torznab request type -> handler
+_DISPATCH = {
+    'caps': _handle_caps,
+    'search': _handle_search,
+    'tvsearch': _handle_tv,
+    'movie': _handle_movie,
+}
+
+def _response_cache_key(t, args):
+    """Everything that can change the rendered /api response"""
+    return (t, args.get('q', '').strip().lower(), args.get('season'), args.get('ep'),
+            args.get('response', 'xml'), args.get('cat', ''))
+
+def _render_api(handler, args):
+    """Render a handler outside of a live request, for background cache refreshes"""
+    with app.test_request_context('/api', query_string=args):
+        response = handler(request.args)
+        return response.get_data(), response.mimetype, response.status_code, response.cache_control.max_age
+
+@app.route('/api')
+def api():
+    t = request.args.get('t')
+    t = t.lower() if t else ''
+    logger.debug("API request: %s", request.args)
+
+    handler = _DISPATCH.get(t)
+    if handler is None:
         logger.error(f"Invalid request type: {t}")
         return Response("Invalid request", status=400)
+    if handler is _handle_caps:
+        # Already served from precomputed bytes
+        return handler(request.args)
+    
+    cache_key = _response_cache_key(t, request.args)
+    cached = response_cache.get(cache_key)
+    if cached:
+        payload, mimetype, status, etag, is_stale = cached
+        if is_stale:
+            # Serve the stale copy now and re-render it in the background
+            args = request.args.copy()
+            response_cache.refresh(cache_key, lambda: _render_api(handler, args))
+        response = Response(payload, mimetype=mimetype, status=status)
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    
+    response = handler(request.args)
+    # Responses that limit their own lifetime keep that limit in the cache too
+    max_age = response.cache_control.max_age
+    if response.is_streamed:
+        # Feeds are cached as they stream out, so only later hits carry an ETag
+        cached_response = Response(response_cache.capture(cache_key, response.response, response.mimetype, response.status_code, max_age),
+                                   mimetype=response.mimetype, status=response.status_code)
+        cached_response.cache_control.max_age = max_age
+        return cached_response
+    
+    # Bodies already in memory are cached up front, so the first response can be revalidated too
+    payload = response.get_data()
+    etag = response_cache.set(cache_key, payload, response.mimetype, response.status_code, max_age)
+    cached_response = Response(payload, mimetype=response.mimetype, status=response.status_code)
+    cached_response.cache_control.max_age = max_age
+    cached_response.set_etag(etag)
+    return cached_response.make_conditional(request)
 
 @app.route('/mapping/update', methods=['POST'])
 def force_mapping_update():
-    """Force an immediate update of the mapping file from remote"""
+    """Force an immediate update of the mapping file from remote.
+    
+    Other workers pick up the rewritten file on their next request.
+    """
     try:
         success = search_service.mapping_service.force_update()
         if success:
@@ -205,7 +307,10 @@ def mapping_stats():
 
 @app.route('/mapping/reload', methods=['POST'])
 def reload_mapping():
-    """Reload mapping from local file (useful for testing local changes)"""
+    """Reload mapping from local file (useful for testing local changes).
+    
+    Other workers reload on their next request if the file changed since they loaded it.
+    """
     try:
         search_service.mapping_service.reload_mappings()
         stats = search_service.mapping_service.get_stats()
@@ -221,35 +326,42 @@ def reload_mapping():
             'message': str(e)
         }), 500
 
+@app.route('/cache/flush', methods=['POST'])
+def flush_cache():
+    """Drop cached AniList lookups, Nyaa metadata and /api responses so the next searches hit upstream again.
+    
+    The counts are this worker's; other workers clear theirs on their next request.
+    """
+    global _flush_seen
+    try:
+        # Touch the marker so the other workers flush too
+        with open(_CACHE_FLUSH_MARKER, 'w') as f:
+            f.write(str(time.time_ns()))
+        _flush_seen = _flush_marker_mtime()
+        cleared, cleared_metadata, cleared_responses = _clear_caches()
+        return jsonify({
+            'success': True,
+            'message': f'Cleared {cleared} cached AniList lookups, {cleared_metadata} cached Nyaa pages and {cleared_responses} cached responses',
+            'stats': search_service.anilist_service.get_cache_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error flushing cache: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 @app.route('/test')
 def test():
     """Test endpoint to debug the search functionality"""
     q = request.args.get('q', 'Fate/stay night')
-    season = request.args.get('season')
-    episode = request.args.get('ep')
-    
-    try:
-        season = int(season) if season else None
-    except ValueError:
-        season = None
-        
-    try:
-        episode = int(episode) if episode else None
-    except ValueError:
-        episode = None
+    season = _parse_int_arg(request.args, 'season')
+    episode = _parse_int_arg(request.args, 'ep')
     
     logger.info(f"Test search for: {q} (season={season}, episode={episode})")
     
     processed_query = query_processor.process_search_query(q, season, episode)
-    result = search_service.perform_search(processed_query, season, episode)
-    
-    # Handle the 5-tuple return value
-    if len(result) == 5:
-        anilist_id, anime_name, processed_torrents, anime_format, year = result
-    else:
-        anilist_id, anime_name, processed_torrents = result
-        anime_format = None
-        year = None
+    anilist_id, anime_name, processed_torrents, anime_format, year = search_service.perform_search(processed_query, season, episode)
     
     if not anilist_id:
         return f"Could not find AniList ID for: {q}"
@@ -257,29 +369,33 @@ def test():
     # Get mapping stats
     mapping_stats = search_service.mapping_service.get_stats()
     
-    result_text = f"<h3>Mapping Stats:</h3>"
-    result_text += f"Total mappings: {mapping_stats['total_mappings']}<br>"
-    result_text += f"Last update: {mapping_stats['last_update']}<br>"
-    result_text += f"Remote URL: {mapping_stats['remote_url']}<br><br>"
-    
-    result_text += f"<h3>Search Results:</h3>"
-    result_text += f"Found {len(processed_torrents)} torrents for {anime_name} ({anime_format}) (ID: {anilist_id}, Year: {year})<br>"
-    result_text += f"Processed query: {processed_query}<br><br>"
+    parts = [
+        "<h3>Mapping Stats:</h3>",
+        f"Total mappings: {mapping_stats['total_mappings']}<br>",
+        f"Last update: {mapping_stats['last_update']}<br>",
+        f"Remote URL: {mapping_stats['remote_url']}<br><br>",
+        "<h3>Search Results:</h3>",
+        f"Found {len(processed_torrents)} torrents for {anime_name} ({anime_format}) (ID: {anilist_id}, Year: {year})<br>",
+        f"Processed query: {processed_query}<br><br>",
+    ]
     
     for i, torrent in enumerate(processed_torrents):
-        result_text += f"Torrent {i+1}:<br>"
+        parts.append(f"Torrent {i+1}:<br>")
         if torrent.get('custom_name'):
-            result_text += f"  - <b>Custom Name: {torrent['custom_name']}</b><br>"
-        result_text += f"  - Movie: {torrent.get('is_movie', False)}<br>"
-        result_text += f"  - Season Pack: {torrent['is_season_pack']}<br>"
-        result_text += f"  - Seasons: {torrent['seasons']}<br>"
-        result_text += f"  - Episodes: {torrent['episode_numbers']}<br>"
-        result_text += f"  - Release Group: {torrent['release_group']}<br>"
-        result_text += f"  - Size: {torrent['total_size'] / (1024**3):.2f} GB<br>"
-        result_text += f"  - Files: {torrent['episode_count']}<br>"
-        result_text += f"  - Is Custom: {torrent.get('is_custom_mapping', False)}<br><br>"
+            parts.append(f"  - <b>Custom Name: {torrent['custom_name']}</b><br>")
+        parts += (
+            f"  - Movie: {torrent.get('is_movie', False)}<br>",
+            f"  - Season Pack: {torrent['is_season_pack']}<br>",
+            f"  - Seasons: {sorted(torrent['seasons'])}<br>",
+            f"  - Episodes: {sorted(torrent['episode_numbers'])}<br>",
+            f"  - Release Group: {torrent['release_group']}<br>",
+            f"  - Size: {torrent['total_size'] / (1024**3):.2f} GB<br>",
+            f"  - Files: {torrent['episode_count']}<br>",
+            f"  - Is Custom: {torrent.get('is_custom_mapping', False)}<br><br>",
+        )
     
-    return result_text
+    return ''.join(parts)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=18621, debug=True)
+    # Development only - production runs under gunicorn (see Dockerfile)
+    app.run(host='0.0.0.0', port=18621, debug=bool(os.getenv('FLASK_DEV')))
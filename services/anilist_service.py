@@ -1,134 +1,211 @@
-import requests
 import logging
+import orjson
+import threading
+from functools import lru_cache
+from cachetools import TTLCache
+from utils.http_session import get_session
 
 logger = logging.getLogger(__name__)
 
+# Lookups answered without a round trip, keyed on the normalized query.
+# 'akira' is also the default for empty movie-category searches.
+# Each entry is what _select_media makes of AniList's response for that search,
+# and must be kept in sync with AniList: the live lookup never runs for these
+# names, so any drift in title, relations, format or year goes unnoticed.
+KNOWN_ANIME = {
+    # Media 47: romaji title "AKIRA", a 1988 movie with no related movies
+    'akira': (47, 'AKIRA', (47,), 'MOVIE', 1988),
+}
+
+NO_RESULT = (None, None, (), None, None)
+
+# Titles whose movie should win even when the search isn't preferring movies
+WELL_KNOWN_MOVIES = frozenset(("akira", "spirited away", "your name", "weathering with you"))
+
+# Relations followed from a movie (to other movies) and from a series (to TV or movie entries)
+MOVIE_RELATIONS = frozenset(("SEQUEL", "PREQUEL", "SIDE_STORY", "ALTERNATIVE"))
+SERIES_RELATIONS = frozenset(("SEQUEL", "PREQUEL"))
+SERIES_RELATED_FORMATS = frozenset(("TV", "MOVIE"))
+
+# Sent per request rather than on the session, which is shared with the HTML/REST clients
+HEADERS = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+
+# One aliased Page per name lets a batch of lookups share a single request.
+# Only the fields read by _select_media are requested; relations can't be
+# filtered server-side.
+PAGE_QUERY = '''
+  q%(i)d: Page(page: 1, perPage: 15) {
+    media(search: $s%(i)d, type: $t%(i)d, sort: [POPULARITY_DESC, START_DATE_DESC]) {
+      id
+      title {
+        romaji
+      }
+      startDate {
+        year
+      }
+      format
+      relations {
+        edges {
+          relationType
+          node {
+            id
+            format
+          }
+        }
+      }
+    }
+  }'''
+
+@lru_cache(maxsize=32)
+def _build_query(count):
+    """Build a GraphQL query searching `count` names at once, aliased q0..q{count-1}"""
+    params = ', '.join(f'$s{i}: String, $t{i}: MediaType' for i in range(count))
+    pages = ''.join(PAGE_QUERY % {'i': i} for i in range(count))
+    return f'query ({params}) {{{pages}\n}}'
+
 class AniListService:
-    def __init__(self):
+    def __init__(self, cache_size=4096, cache_ttl=3600):
         self.base_url = "https://graphql.anilist.co"
+        self.timeout = (3, 10)  # (connect, read) seconds
+        
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.cache_lock = threading.Lock()
+
+    def _cache_key(self, anime_name, search_type):
+        """Normalize the query so trivially different spellings share an entry"""
+        return (anime_name.strip().lower(), search_type)
+
+    def clear_cache(self):
+        """Drop all cached AniList lookups"""
+        with self.cache_lock:
+            cleared = len(self.cache)
+            self.cache.clear()
+        logger.info(f"Cleared {cleared} cached AniList lookups")
+        return cleared
+
+    def get_cache_stats(self):
+        """Get statistics about the AniList lookup cache"""
+        with self.cache_lock:
+            return {
+                'entries': len(self.cache),
+                'max_entries': self.cache.maxsize,
+                'ttl_seconds': self.cache.ttl
+            }
 
     def get_anilist_id_with_relations(self, anime_name, search_type="ANIME"):
         """Get AniList ID, related media, and year with enhanced movie support"""
-        logger.debug(f"Searching AniList for: {anime_name} (type: {search_type})")
+        return self.get_many([anime_name], search_type)[anime_name]
+
+    def get_many(self, anime_names, search_type="ANIME"):
+        """Look up several names at once, sending all cache misses in a single aliased request.
+
+        Returns a dict mapping each input name to its (id, title, related_ids, format, year).
+        """
+        results = {}
+        pending = {}  # cache key -> input names sharing it
         
-        query = '''
-        query ($search: String, $type: MediaType) {
-          Page(page: 1, perPage: 15) {
-            media(search: $search, type: $type, sort: [POPULARITY_DESC, START_DATE_DESC]) {
-              id
-              title {
-                romaji
-                english
-                native
-              }
-              startDate {
-                year
-                month
-                day
-              }
-              endDate {
-                year
-              }
-              popularity
-              format
-              status
-              episodes
-              duration
-              genres
-              relations {
-                edges {
-                  relationType
-                  node {
-                    id
-                    title {
-                      romaji
-                      english
-                      native
-                    }
-                    format
-                    startDate {
-                      year
-                    }
-                    episodes
-                    duration
-                  }
-                }
-              }
-            }
-          }
-        }
-        '''
-        variables = {'search': anime_name, 'type': search_type}
+        for anime_name in anime_names:
+            cache_key = self._cache_key(anime_name, search_type)
+            if search_type == "ANIME":
+                known = KNOWN_ANIME.get(cache_key[0])
+                if known:
+                    logger.debug("Using known AniList entry for: %s", anime_name)
+                    results[anime_name] = known
+                    continue
+            
+            with self.cache_lock:
+                cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("AniList cache hit for: %s (type: %s)", anime_name, search_type)
+                results[anime_name] = cached
+                continue
+            
+            pending.setdefault(cache_key, []).append(anime_name)
+        
+        if not pending:
+            return results
+        
+        cache_keys = list(pending)
+        variables = {}
+        for i, cache_key in enumerate(cache_keys):
+            variables[f's{i}'] = pending[cache_key][0]
+            variables[f't{i}'] = search_type
+        logger.debug("Searching AniList for: %s (type: %s)", [names[0] for names in pending.values()], search_type)
         
         try:
-            res = requests.post(self.base_url, json={'query': query, 'variables': variables})
+            body = orjson.dumps({'query': _build_query(len(cache_keys)), 'variables': variables})
+            res = get_session().post(self.base_url, data=body, headers=HEADERS, timeout=self.timeout)
             res.raise_for_status()
-            data = res.json()
-            logger.debug(f"AniList response: {data}")
-            
-            media_list = data.get("data", {}).get("Page", {}).get("media", [])
-            if not media_list:
-                logger.debug("No anime found in AniList")
-                return None, None, [], None, None
-            
-            # Smart selection logic for movies vs series
-            main_anime = None
-            
-            # Special handling for well-known movies
-            if anime_name.lower() in ["akira", "spirited away", "your name", "weathering with you"]:
-                # Prefer movies for these titles
-                for media in media_list:
-                    if media.get("format") == "MOVIE":
-                        main_anime = media
-                        break
-            
-            # For movie searches, prefer MOVIE format
-            if search_type == "ANIME" and not main_anime:
-                for media in media_list:
-                    if media.get("format") == "MOVIE":
-                        main_anime = media
-                        break
+            data = orjson.loads(res.content)
+            logger.debug("AniList response: %s", data)
+            pages = data.get("data") or {}
             
-            # Fallback to first result
-            if not main_anime:
-                main_anime = media_list[0]
+            for i, cache_key in enumerate(cache_keys):
+                media_list = (pages.get(f'q{i}') or {}).get("media", [])
+                result = self._select_media(cache_key[0], search_type, media_list)
+                with self.cache_lock:
+                    self.cache[cache_key] = result
+                for anime_name in pending[cache_key]:
+                    results[anime_name] = result
             
-            # Collect related media based on type
-            all_related_ids = [main_anime["id"]]
-            main_title = main_anime["title"]["romaji"]
-            main_format = main_anime.get("format", "")
-            main_year = main_anime.get("startDate", {}).get("year")
-            
-            logger.debug(f"Main anime format: {main_format}, year: {main_year}")
+        except Exception as e:
+            logger.error(f"Error querying AniList: {e}")
+            for names in pending.values():
+                for anime_name in names:
+                    results[anime_name] = NO_RESULT
+        
+        return results
+
+    def _select_media(self, normalized_name, search_type, media_list):
+        """Pick the main entry from a search page and collect its related IDs"""
+        if not media_list:
+            logger.debug("No anime found in AniList")
+            return NO_RESULT
+        
+        # Smart selection logic for movies vs series: well-known movies and anime
+        # searches prefer the first MOVIE entry, in a single scan
+        main_anime = None
+        if search_type == "ANIME" or normalized_name in WELL_KNOWN_MOVIES:
+            main_anime = next((media for media in media_list if media.get("format") == "MOVIE"), None)
+        
+        # Fallback to first result
+        if not main_anime:
+            main_anime = media_list[0]
+        
+        # Collect related media based on type; the set only backs membership checks
+        all_related_ids = [main_anime["id"]]
+        seen_ids = {main_anime["id"]}
+        main_title = main_anime["title"]["romaji"]
+        main_format = main_anime.get("format", "")
+        main_year = main_anime.get("startDate", {}).get("year")
+        
+        logger.debug("Main anime format: %s, year: %s", main_format, main_year)
+        
+        # Get relations - different logic for movies vs series
+        relations = main_anime.get("relations", {}).get("edges", [])
+        for relation in relations:
+            relation_type = relation.get("relationType", "")
+            related_media = relation.get("node", {})
+            related_format = related_media.get("format", "")
             
-            # Get relations - different logic for movies vs series
-            relations = main_anime.get("relations", {}).get("edges", [])
-            for relation in relations:
-                relation_type = relation.get("relationType", "")
-                related_media = relation.get("node", {})
-                related_format = related_media.get("format", "")
-                
-                if main_format == "MOVIE":
-                    # For movies, include sequels, prequels, and related movies
-                    if relation_type in ["SEQUEL", "PREQUEL", "SIDE_STORY", "ALTERNATIVE"] and related_format == "MOVIE":
+            if main_format == "MOVIE":
+                # For movies, include sequels, prequels, and related movies
+                if relation_type in MOVIE_RELATIONS and related_format == "MOVIE":
+                    related_id = related_media.get("id")
+                    if related_id and related_id not in seen_ids:
+                        seen_ids.add(related_id)
+                        all_related_ids.append(related_id)
+                        logger.debug("Found related movie: ID %s (Type: %s)", related_id, relation_type)
+            else:
+                # For series, use existing logic
+                if relation_type in SERIES_RELATIONS:
+                    if related_format in SERIES_RELATED_FORMATS:
                         related_id = related_media.get("id")
-                        if related_id and related_id not in all_related_ids:
+                        if related_id and related_id not in seen_ids:
+                            seen_ids.add(related_id)
                             all_related_ids.append(related_id)
-                            related_title = related_media.get("title", {}).get("romaji", "")
-                            logger.debug(f"Found related movie: {related_title} (ID: {related_id}, Type: {relation_type})")
-                else:
-                    # For series, use existing logic
-                    if relation_type in ["SEQUEL", "PREQUEL"]:
-                        if related_format in ["TV", "MOVIE"]:
-                            related_id = related_media.get("id")
-                            if related_id and related_id not in all_related_ids:
-                                all_related_ids.append(related_id)
-                                related_title = related_media.get("title", {}).get("romaji", "")
-                                logger.debug(f"Found related season: {related_title} (ID: {related_id}, Type: {relation_type})")
-            
-            logger.debug(f"Found main anime: {main_title} ({main_format}) with {len(all_related_ids)} total entries")
-            return main_anime["id"], main_title, all_related_ids, main_format, main_year
-            
-        except Exception as e:
-            logger.error(f"Error querying AniList: {e}")
-            return None, None, [], None, None
+                            logger.debug("Found related season: ID %s (Type: %s)", related_id, relation_type)
+        
+        logger.debug("Found main anime: %s (%s) with %s total entries", main_title, main_format, len(all_related_ids))
+        # Cached results are shared between callers, so hand out an immutable ID tuple
+        return main_anime["id"], main_title, tuple(all_related_ids), main_format, main_year
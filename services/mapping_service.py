@@ -1,112 +1,301 @@
-import json
+import glob
+import hashlib
+import msgpack
+import orjson
 import os
 import re
+import sys
 import logging
 import requests
+import tempfile
 import threading
-import time
+from cachetools import LRUCache
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from utils.http_session import get_session
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; there's only ever one process there anyway
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# Partial matches are answered from an inverted index of character n-grams
+NGRAM_SIZE = 3
+# Partial match results remembered per index version
+PARTIAL_CACHE_SIZE = 4096
+# Bump whenever the snapshot contents or how the search index is built change,
+# so snapshots written by older code are never loaded
+SNAPSHOT_FORMAT_VERSION = 1
+_MISSING = object()
+
+# Torrent name / search term patterns, compiled once at import. Season and
+# episode patterns are tried in order since earlier ones are more reliable.
+GROUP_RE = re.compile(r'\[([^\]]+)\]')
+SEASON_RES = (
+    re.compile(r'Season\s*(\d+)', re.IGNORECASE),
+    re.compile(r'S(\d+)', re.IGNORECASE),
+)
+EPISODE_RANGE_RE = re.compile(r'(\d+)\s*-\s*(\d+)')
+EPISODE_RES = (
+    re.compile(r'E(\d+)', re.IGNORECASE),
+    re.compile(r'Episode\s*(\d+)', re.IGNORECASE),
+    re.compile(r'Ep\.?\s*(\d+)', re.IGNORECASE),
+)
+BATCH_WORDS_RE = re.compile(r'complete|batch|full')
+NON_WORD_RE = re.compile(r'[^\w\s]')
+WHITESPACE_RE = re.compile(r'\s+')
+
+def _write_atomic(path: str, data: bytes):
+    """Write a file so other processes only ever see the old or the new contents"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def _ngrams(term: str) -> set:
+    """Distinct character n-grams of a normalized term (empty if it is too short)"""
+    return {term[i:i + NGRAM_SIZE] for i in range(len(term) - NGRAM_SIZE + 1)}
+
+def _normalize_search_term(term: str) -> str:
+    """Normalize search terms for consistent matching"""
+    # Convert to lowercase, remove special characters, collapse spaces
+    normalized = term.lower()
+    # Keep alphanumeric and spaces only
+    normalized = NON_WORD_RE.sub(' ', normalized)
+    # Collapse multiple spaces to single space
+    normalized = WHITESPACE_RE.sub(' ', normalized).strip()
+    return normalized
+
+@lru_cache(maxsize=4096)
+def _normalize_query(query: str) -> str:
+    """Normalize a search query; cached since pollers repeat queries"""
+    return _normalize_search_term(query)
+
+class MappingIndex(NamedTuple):
+    """Loaded mappings and the lookup structures built from them, swapped as one unit"""
+    mappings: Dict
+    settings: Dict
+    search_index: Dict[str, str]
+    ngram_index: Dict[str, set]
+    term_order: Dict[str, int]
+    max_term_length: int
+    partial_matches: LRUCache
+
 class MappingService:
     def __init__(self, mapping_file_path='mapping.json', remote_url=None, update_interval_hours=1):
         self.mapping_file_path = mapping_file_path
         self.remote_url = remote_url or 'https://raw.githubusercontent.com/samtheruby/seadex-API-Mappings/refs/heads/main/mapping.json'
         self.update_interval_hours = update_interval_hours
-        self.mappings = {}
-        self.search_index = {}
-        self.settings = {}
+        self._index = self._build_index({}, {}, {})
+        # Serializes reloads; readers never take it (see _load_mapping_bytes)
+        self._load_lock = threading.Lock()
+        self._partial_lock = threading.Lock()
         self.last_update = None
-        self.update_thread = None
+        # Validators from the last remote download, for conditional GETs
+        self._etag = None
+        self._last_modified = None
+        self.update_timer = None
         self.stop_updates = False
+        # Modification time of the mapping file as last loaded, to notice when
+        # another worker rewrites it (see reload_if_changed)
+        self._loaded_mtime = None
         
-        # Load mappings on initialization
+        # Load mappings on initialization. The update timer is left to the caller:
+        # under gunicorn --preload this runs in the master, and a thread started
+        # here would never run in the forked workers
         self.initialize_mappings()
-        
-        # Start background update thread
-        self.start_auto_updates()
+    
+    @property
+    def mappings(self) -> Dict:
+        return self._index.mappings
+    
+    @property
+    def settings(self) -> Dict:
+        return self._index.settings
+    
+    @property
+    def search_index(self) -> Dict[str, str]:
+        return self._index.search_index
     
     def initialize_mappings(self):
         """Initialize mappings - download from remote or use local"""
-        # First, try to download from remote
-        if self.download_remote_mapping():
-            logger.info("Successfully downloaded remote mapping file")
-        elif os.path.exists(self.mapping_file_path):
-            # Fall back to local file if remote download fails
-            logger.info("Using existing local mapping file")
-            self.load_mappings()
-        else:
-            # Create default if nothing exists
-            logger.info("No mapping file found, creating default")
-            self.create_default_mapping_file()
-            self.load_mappings()
+        with self._refresh_lock():
+            # A restart within the update interval can use the local copy as is
+            if self._restore_meta():
+                logger.info("Local mapping file is current, skipping remote download")
+                self.load_mappings()
+                return
+            
+            # First, try to download from remote
+            if self.download_remote_mapping():
+                logger.info("Successfully downloaded remote mapping file")
+            elif os.path.exists(self.mapping_file_path):
+                # Fall back to local file if remote download fails
+                logger.info("Using existing local mapping file")
+                self.load_mappings()
+            else:
+                # Create default if nothing exists
+                logger.info("No mapping file found, creating default")
+                self.create_default_mapping_file()
+                self.load_mappings()
+    
+    def _lock_path(self) -> str:
+        """Path of the lock file guarding the mapping file, its metadata and snapshots"""
+        base, _ = os.path.splitext(self.mapping_file_path)
+        return f"{base}.lock"
+    
+    @contextmanager
+    def _refresh_lock(self):
+        """Hold the cross-process lock so only one process refreshes the mapping files at a time"""
+        with open(self._lock_path(), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Closing the file releases the lock
+            yield
+    
+    def _refresh(self) -> bool:
+        """Bring the mappings up to date, downloading only if no other process just did"""
+        with self._refresh_lock():
+            previous_update = self.last_update
+            is_current = self._restore_meta()
+            # Another worker may have replaced the shared file since we last loaded it
+            if self.last_update != previous_update:
+                logger.info("Mapping file was updated by another process, reloading")
+                self.load_mappings()
+            if is_current:
+                return True
+            return self.download_remote_mapping()
     
     def download_remote_mapping(self) -> bool:
         """Download mapping file from remote URL"""
         try:
             logger.info(f"Downloading mapping file from: {self.remote_url}")
-            response = requests.get(self.remote_url, timeout=30)
+            headers = {}
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+            response = get_session().get(self.remote_url, headers=headers, timeout=30)
             response.raise_for_status()
             
-            # Validate JSON
-            mapping_data = response.json()
+            # Unchanged upstream: the loaded mappings are already current
+            if response.status_code == 304:
+                # After a restart the validators may come from disk before anything is loaded
+                if not self.mappings:
+                    self.load_mappings()
+                self.last_update = datetime.now()
+                self._write_meta()
+                logger.info("Remote mapping file not modified")
+                return True
             
-            # Save to local file
-            with open(self.mapping_file_path, 'w', encoding='utf-8') as f:
-                json.dump(mapping_data, f, indent=2, ensure_ascii=False)
+            # Validate JSON and load the new mappings
+            self._load_mapping_bytes(response.content)
             
-            # Load the new mappings
-            self.mappings = mapping_data.get('mappings', {})
-            self.settings = mapping_data.get('settings', {
-                'fallback_to_seadex': True,
-                'priority': 'mapping_first'
-            })
-            self._build_search_index()
+            # Save the raw file locally so its snapshot also serves local reloads
+            _write_atomic(self.mapping_file_path, response.content)
+            self._loaded_mtime = self._file_mtime()
             
+            self._etag = response.headers.get('ETag')
+            self._last_modified = response.headers.get('Last-Modified')
             self.last_update = datetime.now()
+            self._write_meta()
             logger.info(f"Successfully updated mappings from remote. Found {len(self.mappings)} entries")
             return True
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to download remote mapping file: {e}")
             return False
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON in remote mapping file: {e}")
             return False
         except Exception as e:
             logger.error(f"Unexpected error downloading mapping file: {e}")
             return False
     
+    def _meta_path(self) -> str:
+        """Path of the file recording when and at which version the mapping file was fetched"""
+        base, _ = os.path.splitext(self.mapping_file_path)
+        return f"{base}.meta.json"
+    
+    def _write_meta(self):
+        """Persist the download validators and update time so they survive restarts"""
+        try:
+            _write_atomic(self._meta_path(), orjson.dumps({
+                'etag': self._etag,
+                'last_modified': self._last_modified,
+                'updated_at': self.last_update.timestamp()
+            }))
+        except Exception as e:
+            logger.warning(f"Could not write mapping metadata {self._meta_path()}: {e}")
+    
+    def _restore_meta(self) -> bool:
+        """Restore persisted download state; True if the local file is recent enough to use without a download"""
+        if not os.path.exists(self.mapping_file_path) or not os.path.exists(self._meta_path()):
+            return False
+        
+        try:
+            with open(self._meta_path(), 'rb') as f:
+                meta = orjson.loads(f.read())
+            updated_at = datetime.fromtimestamp(meta['updated_at'])
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable mapping metadata {self._meta_path()}: {e}")
+            return False
+        
+        self._etag = meta.get('etag')
+        self._last_modified = meta.get('last_modified')
+        self.last_update = updated_at
+        return datetime.now() - updated_at < timedelta(hours=self.update_interval_hours)
+    
     def start_auto_updates(self):
-        """Start background thread for automatic updates"""
-        def update_loop():
-            while not self.stop_updates:
-                # Wait for the update interval
-                time.sleep(self.update_interval_hours * 3600)  # Convert hours to seconds
-                
-                if not self.stop_updates:
-                    logger.info("Running scheduled mapping update")
-                    if self.download_remote_mapping():
-                        logger.info("Scheduled update completed successfully")
-                    else:
-                        logger.warning("Scheduled update failed, will retry next interval")
+        """Schedule automatic updates on a self-rescheduling timer"""
+        # Called once per serving process; threads don't survive fork
+        if self.update_timer and self.update_timer.is_alive():
+            return
+        
+        self.stop_updates = False
+        self._schedule_update()
+        logger.info(f"Started auto-update timer (interval: {self.update_interval_hours} hours)")
+    
+    def _schedule_update(self):
+        """Arm the timer for the next scheduled update"""
+        self.update_timer = threading.Timer(self.update_interval_hours * 3600, self._run_scheduled_update)
+        self.update_timer.daemon = True
+        self.update_timer.start()
+    
+    def _run_scheduled_update(self):
+        """Run one scheduled update, then reschedule"""
+        if self.stop_updates:
+            return
         
-        self.update_thread = threading.Thread(target=update_loop, daemon=True)
-        self.update_thread.start()
-        logger.info(f"Started auto-update thread (interval: {self.update_interval_hours} hours)")
+        logger.info("Running scheduled mapping update")
+        if self._refresh():
+            logger.info("Scheduled update completed successfully")
+        else:
+            logger.warning("Scheduled update failed, will retry next interval")
+        
+        if not self.stop_updates:
+            self._schedule_update()
     
     def stop_auto_updates(self):
-        """Stop the background update thread"""
+        """Stop automatic updates"""
         self.stop_updates = True
-        if self.update_thread:
-            self.update_thread.join(timeout=5)
+        if self.update_timer:
+            self.update_timer.cancel()
     
     def force_update(self) -> bool:
         """Force an immediate update from remote"""
         logger.info("Forcing immediate mapping update")
-        return self.download_remote_mapping()
+        with self._refresh_lock():
+            return self.download_remote_mapping()
     
     def get_last_update_time(self) -> Optional[datetime]:
         """Get the last successful update time"""
@@ -118,64 +307,185 @@ class MappingService:
             logger.warning(f"Local mapping file not found at {self.mapping_file_path}")
             return
         
+        # Taken before reading, so a rewrite during the read is still noticed later.
+        # A file that fails to load isn't retried until it changes again
+        self._loaded_mtime = self._file_mtime()
         try:
-            with open(self.mapping_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.mappings = data.get('mappings', {})
-                self.settings = data.get('settings', {
-                    'fallback_to_seadex': True,
-                    'priority': 'mapping_first'
-                })
-                self._build_search_index()
-                logger.info(f"Loaded {len(self.mappings)} mapping entries from local file")
+            with open(self.mapping_file_path, 'rb') as f:
+                self._load_mapping_bytes(f.read())
+            logger.info(f"Loaded {len(self.mappings)} mapping entries from local file")
         except Exception as e:
             logger.error(f"Error loading local mapping file: {e}")
-            self.mappings = {}
-            self.settings = {}
-            self.search_index = {}
+            self._index = self._build_index({}, {}, {})
     
-    def _build_search_index(self):
+    def _file_mtime(self) -> Optional[int]:
+        """Modification time of the mapping file in ns, or None if it doesn't exist"""
+        try:
+            return os.stat(self.mapping_file_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def reload_if_changed(self) -> bool:
+        """Reload the mappings if the file was rewritten since they were loaded.
+        
+        Workers share the mapping file but not the loaded index, so this is how an
+        update or reload done by one worker reaches the others.
+        """
+        if self._file_mtime() == self._loaded_mtime:
+            return False
+        logger.info("Mapping file changed on disk, reloading")
+        # Keep the download validators in step with the file that was written
+        self._restore_meta()
+        self.load_mappings()
+        return True
+    
+    def _snapshot_path(self, digest: str) -> str:
+        """Path of the preparsed snapshot for a mapping file with the given digest"""
+        base, _ = os.path.splitext(self.mapping_file_path)
+        return f"{base}.cache.v{SNAPSHOT_FORMAT_VERSION}.{digest}.msgpack"
+    
+    def _load_mapping_bytes(self, raw: bytes):
+        """Load mappings from raw mapping file contents, via a msgpack snapshot when one exists"""
+        with self._load_lock:
+            self._index = self._parse_mapping_bytes(raw)
+    
+    def _parse_mapping_bytes(self, raw: bytes) -> MappingIndex:
+        """Build a MappingIndex from raw mapping file contents"""
+        digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+        snapshot_path = self._snapshot_path(digest)
+        
+        # A snapshot already holds the parsed file and its search index
+        if os.path.exists(snapshot_path):
+            try:
+                with open(snapshot_path, 'rb') as f:
+                    snapshot = msgpack.unpackb(f.read(), raw=False)
+                index = self._build_index(snapshot['mappings'], snapshot['settings'], snapshot['search_index'])
+                logger.debug("Loaded mappings from snapshot %s", snapshot_path)
+                return index
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable mapping snapshot {snapshot_path}: {e}")
+        
+        data = orjson.loads(raw)
+        mappings = data.get('mappings', {})
+        settings = data.get('settings', {
+            'fallback_to_seadex': True,
+            'priority': 'mapping_first'
+        })
+        index = self._build_index(mappings, settings, self._build_search_index(mappings))
+        self._write_snapshot(snapshot_path, index)
+        return index
+    
+    def _write_snapshot(self, snapshot_path: str, index: MappingIndex):
+        """Write the parsed mappings to a msgpack snapshot, replacing older ones"""
+        base, _ = os.path.splitext(self.mapping_file_path)
+        try:
+            _write_atomic(snapshot_path, msgpack.packb({
+                'mappings': index.mappings,
+                'settings': index.settings,
+                'search_index': index.search_index
+            }, use_bin_type=True))
+            # Older snapshots go only once the new one is in place
+            for stale_path in glob.glob(f"{glob.escape(base)}.cache.*.msgpack"):
+                if stale_path != snapshot_path:
+                    os.remove(stale_path)
+        except Exception as e:
+            logger.warning(f"Could not write mapping snapshot {snapshot_path}: {e}")
+    
+    def _build_search_index(self, mappings: Dict) -> Dict[str, str]:
         """Build search index for fast lookup including alternative search terms"""
-        self.search_index = {}
+        # Index by primary key and alternative search terms; strings are interned
+        # since the same keys are shared with the n-gram index and snapshots
+        return {
+            sys.intern(_normalize_search_term(term)): primary_key
+            for primary_key, mapping_data in ((sys.intern(key), data) for key, data in mappings.items())
+            for term in (primary_key, *mapping_data.get('also_search', ()))
+        }
+    
+    def _build_index(self, mappings: Dict, settings: Dict, search_index: Dict[str, str]) -> MappingIndex:
+        """Build the n-gram inverted index over search_index terms and bundle it with the mappings.
         
-        for primary_key, mapping_data in self.mappings.items():
-            # Index by primary key
-            normalized_key = self._normalize_search_term(primary_key)
-            self.search_index[normalized_key] = primary_key
-            
-            # Index by alternative search terms
-            for alt_term in mapping_data.get('also_search', []):
-                normalized_alt = self._normalize_search_term(alt_term)
-                self.search_index[normalized_alt] = primary_key
-    
-    def _normalize_search_term(self, term: str) -> str:
-        """Normalize search terms for consistent matching"""
-        # Convert to lowercase, remove special characters, collapse spaces
-        normalized = term.lower()
-        # Keep alphanumeric and spaces only
-        normalized = re.sub(r'[^\w\s]', ' ', normalized)
-        # Collapse multiple spaces to single space
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
-        return normalized
+        The result is never mutated once built: reloads build a new one and rebind
+        self._index, which is atomic, so readers that take a local reference to it
+        see one consistent version without locking.
+        """
+        ngram_index = {}
+        term_order = {}
+        
+        for position, term in enumerate(search_index):
+            # Remember index order so partial matches still prefer the earliest term
+            term_order[term] = position
+            for gram in _ngrams(term):
+                ngram_index.setdefault(gram, set()).add(term)
+        
+        return MappingIndex(
+            mappings=mappings,
+            settings=settings,
+            search_index=search_index,
+            ngram_index=ngram_index,
+            term_order=term_order,
+            max_term_length=max(map(len, term_order), default=0),
+            partial_matches=LRUCache(maxsize=PARTIAL_CACHE_SIZE)
+        )
+    
+    def _find_partial_term(self, index: MappingIndex, normalized_query: str) -> Optional[str]:
+        """Find the earliest indexed term that contains or is contained in the query"""
+        query_grams = _ngrams(normalized_query)
+        if not query_grams:
+            # Too short to have n-grams; fall back to a scan. A term that normalized
+            # to '' would be "in" every query, so it never matches, as below
+            for indexed_term in index.search_index:
+                if indexed_term and (indexed_term in normalized_query or normalized_query in indexed_term):
+                    return indexed_term
+            return None
+        
+        # Terms inside the query are substrings of it; probing each one against the
+        # index costs the same however many terms are indexed
+        query_length = len(normalized_query)
+        candidates = [
+            normalized_query[start:end]
+            for start in range(query_length)
+            for end in range(start + 1, min(query_length, start + index.max_term_length) + 1)
+            if normalized_query[start:end] in index.search_index
+        ]
+        
+        # Terms containing the query appear in every one of the query's posting lists
+        postings = sorted((index.ngram_index.get(gram, set()) for gram in query_grams), key=len)
+        if postings[0]:
+            for term in postings[0].intersection(*postings[1:]):
+                if normalized_query in term:
+                    candidates.append(term)
+        
+        return min(candidates, key=index.term_order.__getitem__, default=None)
     
     def find_mapping(self, query: str) -> Optional[Dict]:
         """Find a mapping for the given search query"""
-        normalized_query = self._normalize_search_term(query)
+        normalized_query = _normalize_query(query)
+        if not normalized_query:
+            # Nothing left to match on; a partial match would hit every term
+            return None
+        # One version of the index for the whole lookup, even if a reload lands midway
+        index = self._index
         
         # Direct match in search index
-        if normalized_query in self.search_index:
-            primary_key = self.search_index[normalized_query]
-            logger.debug(f"Found direct mapping for '{query}' -> '{primary_key}'")
-            return self.mappings[primary_key]
+        if normalized_query in index.search_index:
+            primary_key = index.search_index[normalized_query]
+            logger.debug("Found direct mapping for '%s' -> '%s'", query, primary_key)
+            return index.mappings[primary_key]
         
-        # Partial match - check if query contains or is contained in indexed terms
-        for indexed_term, primary_key in self.search_index.items():
-            # Check both directions for flexibility
-            if indexed_term in normalized_query or normalized_query in indexed_term:
-                logger.debug(f"Found partial mapping for '{query}' -> '{primary_key}'")
-                return self.mappings[primary_key]
+        # Partial match - check if query contains or is contained in indexed terms.
+        # This is the costly path, and its cache lives and dies with the index
+        with self._partial_lock:
+            indexed_term = index.partial_matches.get(normalized_query, _MISSING)
+        if indexed_term is _MISSING:
+            indexed_term = self._find_partial_term(index, normalized_query)
+            with self._partial_lock:
+                index.partial_matches[normalized_query] = indexed_term
+        if indexed_term is not None:
+            primary_key = index.search_index[indexed_term]
+            logger.debug("Found partial mapping for '%s' -> '%s'", query, primary_key)
+            return index.mappings[primary_key]
         
-        logger.debug(f"No mapping found for: {query}")
+        logger.debug("No mapping found for: %s", query)
         return None
     
     def get_custom_torrents(self, mapping: Dict) -> List[Dict]:
@@ -186,23 +496,24 @@ class MappingService:
         
         for torrent in mapping.get('torrents', []):
             if torrent.get('nyaa_id') and torrent.get('name'):
+                # Lowercase once; every keyword test below runs against it
+                lname = torrent['name'].lower()
                 # Parse season and episode info from the custom name
-                parsed_info = self._parse_torrent_name(torrent['name'])
+                parsed_info = self._parse_torrent_name(torrent['name'], lname)
                 
                 custom_torrent = {
                     'nyaa_id': torrent['nyaa_id'],
                     'url': f"https://nyaa.si/view/{torrent['nyaa_id']}",
                     'custom_name': torrent['name'],  # Full custom name with all info
                     'release_group': parsed_info['release_group'],
-                    'is_best': 'best' in torrent['name'].lower(),
-                    'dual_audio': 'dual audio' in torrent['name'].lower(),
+                    'is_best': 'best' in lname,
+                    'dual_audio': 'dual audio' in lname,
                     'info_hash': '',
                     'files': [],
                     'tracker': 'Nyaa',
                     'is_season_pack': parsed_info['is_season_pack'],
                     'is_movie': anime_format == 'MOVIE',
                     'anime_format': anime_format,
-                    'episodes': [],
                     'total_size': 0,
                     'episode_count': parsed_info['episode_count'],
                     'seasons': parsed_info['seasons'],
@@ -215,8 +526,11 @@ class MappingService:
         
         return custom_torrents
     
-    def _parse_torrent_name(self, name: str) -> Dict:
+    def _parse_torrent_name(self, name: str, lname: Optional[str] = None) -> Dict:
         """Parse torrent name to extract season, episode, and other info"""
+        if lname is None:
+            lname = name.lower()
+        
         result = {
             'release_group': 'Unknown',
             'season': 1,
@@ -228,26 +542,20 @@ class MappingService:
         }
         
         # Extract release group [Group] at the beginning
-        group_match = re.match(r'\[([^\]]+)\]', name)
+        group_match = GROUP_RE.match(name)
         if group_match:
             result['release_group'] = group_match.group(1)
         
         # Check for season info
-        season_patterns = [
-            r'Season\s*(\d+)',
-            r'S(\d+)',
-            r's(\d+)',
-        ]
-        
-        for pattern in season_patterns:
-            match = re.search(pattern, name, re.IGNORECASE)
+        for pattern in SEASON_RES:
+            match = pattern.search(name)
             if match:
                 result['season'] = int(match.group(1))
                 result['seasons'] = [result['season']]
                 break
         
         # Check for episode ranges (e.g., "01-12", "1-24", "Episodes 1-12")
-        episode_range_match = re.search(r'(\d+)\s*-\s*(\d+)', name)
+        episode_range_match = EPISODE_RANGE_RE.search(name)
         if episode_range_match:
             start_ep = int(episode_range_match.group(1))
             end_ep = int(episode_range_match.group(2))
@@ -256,14 +564,8 @@ class MappingService:
             result['is_season_pack'] = True
         else:
             # Check for single episode
-            episode_patterns = [
-                r'E(\d+)',
-                r'Episode\s*(\d+)',
-                r'Ep\.?\s*(\d+)',
-            ]
-            
-            for pattern in episode_patterns:
-                match = re.search(pattern, name, re.IGNORECASE)
+            for pattern in EPISODE_RES:
+                match = pattern.search(name)
                 if match:
                     result['episode'] = int(match.group(1))
                     result['episode_numbers'] = [result['episode']]
@@ -271,7 +573,7 @@ class MappingService:
                     break
         
         # If no episode info found but it says "Complete" or "Batch", assume season pack
-        if not result['episode_numbers'] and any(word in name.lower() for word in ['complete', 'batch', 'full']):
+        if not result['episode_numbers'] and BATCH_WORDS_RE.search(lname):
             result['is_season_pack'] = True
             # Estimate episodes based on common anime season lengths
             result['episode_count'] = 12  # Default assumption
@@ -309,7 +611,7 @@ class MappingService:
                 }
             },
             "settings": {
-                "fallback_to_seadex": true,
+                "fallback_to_seadex": True,
                 "priority": "mapping_first",
                 "remote_url": "https://raw.githubusercontent.com/samtheruby/seadex-API-Mappings/refs/heads/main/mapping.json",
                 "update_interval_hours": 1
@@ -317,8 +619,7 @@ class MappingService:
         }
         
         try:
-            with open(self.mapping_file_path, 'w', encoding='utf-8') as f:
-                json.dump(default_mappings, f, indent=2, ensure_ascii=False)
+            _write_atomic(self.mapping_file_path, orjson.dumps(default_mappings, option=orjson.OPT_INDENT_2))
             logger.info(f"Created default mapping file at {self.mapping_file_path}")
         except Exception as e:
             logger.error(f"Error creating default mapping file: {e}")
@@ -330,9 +631,10 @@ class MappingService:
     
     def get_stats(self) -> Dict:
         """Get statistics about the current mappings"""
+        index = self._index
         return {
-            'total_mappings': len(self.mappings),
-            'total_search_terms': len(self.search_index),
+            'total_mappings': len(index.mappings),
+            'total_search_terms': len(index.search_index),
             'last_update': self.last_update.isoformat() if self.last_update else None,
             'remote_url': self.remote_url,
             'update_interval_hours': self.update_interval_hours
@@ -1,64 +1,144 @@
-import requests
+import calendar
 import logging
+import re
+import threading
+import time
 from bs4 import BeautifulSoup
-from datetime import datetime
+from cachetools import TTLCache
+from concurrent.futures import Future, ThreadPoolExecutor
+from html import unescape
+from types import MappingProxyType
 from utils.size_utils import SizeUtils
+from utils.http_session import get_session
 
 logger = logging.getLogger(__name__)
 
+# Everything we read sits in the info panel above the description; the description,
+# file list and comments below it can be far larger and are never looked at
+DESCRIPTION_MARKER = 'id="torrent-description"'
+
+# The info panel's six fields in one pass, in page order; pages that don't match
+# (layout changes) fall back to BeautifulSoup. Only the markup's whitespace is
+# matched by \s, so ASCII classes do; field values are stripped separately
+PANEL_RE = re.compile(
+    r'<h3 class="panel-title">\s*(?P<title>[^<]*?)\s*</h3>'
+    r'.*?Date:</div>\s*<div[^>]*>(?P<date>[^<]*)</div>'
+    r'.*?Seeders:</div>\s*<div[^>]*>\s*<span[^>]*>(?P<seeders>[^<]*)</span>'
+    r'.*?Leechers:</div>\s*<div[^>]*>\s*<span[^>]*>(?P<leechers>[^<]*)</span>'
+    r'.*?File size:</div>\s*<div[^>]*>(?P<size>[^<]*)</div>'
+    r'.*?Completed:</div>\s*<div[^>]*>(?P<completed>[^<]*)</div>',
+    re.DOTALL | re.ASCII
+)
+
+# Concurrent view page fetches per process; well under the shared session's pool size
+MAX_CONCURRENT_FETCHES = 16
+
+def _done(result):
+    """A future that's already resolved to result"""
+    future = Future()
+    future.set_result(result)
+    return future
+
 class NyaaService:
-    def __init__(self):
+    def __init__(self, cache_size=10000, cache_ttl=1800):
         self.base_url = "https://nyaa.si"
+        self.timeout = (3, 10)  # (connect, read) seconds
         self.size_utils = SizeUtils()
+        self.executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES, thread_name_prefix="nyaa")
+        
+        # Indexers poll the same popular torrents over and over; seeder counts
+        # drifting for a while is fine, a page fetch per poll isn't
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.cache_lock = threading.Lock()
+
+    def clear_cache(self):
+        """Drop all cached Nyaa metadata"""
+        with self.cache_lock:
+            cleared = len(self.cache)
+            self.cache.clear()
+        logger.info(f"Cleared {cleared} cached Nyaa metadata entries")
+        return cleared
 
-    def fetch_nyaa_metadata(self, nyaa_id: int) -> dict | None:
+    def fetch_nyaa_metadata_many(self, nyaa_ids):
+        """Fetch metadata for several torrents concurrently, yielding results in input order"""
+        # The same torrent can be listed under several related entries; fetch it once,
+        # and answer cached ones without touching the pool
+        futures = {}
+        for nyaa_id in nyaa_ids:
+            if nyaa_id in futures:
+                continue
+            with self.cache_lock:
+                cached = self.cache.get(nyaa_id)
+            if cached is not None:
+                futures[nyaa_id] = _done(cached)
+            else:
+                futures[nyaa_id] = self.executor.submit(self.fetch_nyaa_metadata, nyaa_id)
+        return self._results_in_order(nyaa_ids, futures)
+
+    def _results_in_order(self, nyaa_ids, futures):
+        """Yield fetch results in nyaa_ids order, cancelling what's left if abandoned"""
+        try:
+            for nyaa_id in nyaa_ids:
+                yield futures[nyaa_id].result()
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+    def fetch_nyaa_metadata(self, nyaa_id: int) -> MappingProxyType | None:
         """Fetch additional metadata from Nyaa (seeders, leechers, etc.)"""
+        with self.cache_lock:
+            cached = self.cache.get(nyaa_id)
+        if cached is not None:
+            logger.debug("Nyaa cache hit for ID: %s", nyaa_id)
+            return cached
+        
         url = f"{self.base_url}/view/{nyaa_id}"
-        logger.debug(f"Fetching Nyaa metadata for ID: {nyaa_id}")
+        logger.debug("Fetching Nyaa metadata for ID: %s", nyaa_id)
         
         try:
-            res = requests.get(url)
+            res = get_session().get(url, timeout=self.timeout)
             res.raise_for_status()
         except Exception as e:
             logger.error(f"Failed to fetch Nyaa page {nyaa_id}: {e}")
             return None
 
-        soup = BeautifulSoup(res.text, "html.parser")
+        # Failures above aren't cached, so the next poll retries them. Cached
+        # metadata is shared by every feed that lists the torrent, so it's read-only
+        metadata = MappingProxyType(self._parse_html(res.text))
+        with self.cache_lock:
+            self.cache[nyaa_id] = metadata
+        return metadata
 
-        def get_text(selector):
-            el = soup.select_one(selector)
-            return el.text.strip() if el else ""
+    def _parse_html(self, html: str) -> dict:
+        """Extract metadata from the HTML of a Nyaa view page"""
+        cut = html.find(DESCRIPTION_MARKER)
+        if cut != -1:
+            html = html[:cut]
 
-        title = get_text("body > div > div:nth-child(1) > div.panel-heading > h3")
-        date_str = get_text("div.row:nth-child(1) > div:nth-child(4)")
-        seeders = get_text("div.row:nth-child(2) > div:nth-child(4) > span:nth-child(1)")
-        leechers = get_text("div.row:nth-child(3) > div:nth-child(4) > span:nth-child(1)")
-        size_str = get_text("div.row:nth-child(4) > div:nth-child(2)")
-        completed = get_text("div.row:nth-child(4) > div:nth-child(4)")
+        match = PANEL_RE.search(html)
+        if match:
+            title, date_str, seeders, leechers, size_str, completed = (unescape(value).strip() for value in match.groups())
+        else:
+            logger.debug("Nyaa page layout not recognised, parsing with BeautifulSoup")
+            title, date_str, seeders, leechers, size_str, completed = self._select_fields(html)
 
-        # Convert numeric values safely
-        try:
-            seeders = int(seeders)
-        except:
-            seeders = 0
-        try:
-            leechers = int(leechers)
-        except:
-            leechers = 0
-        try:
-            completed = int(completed)
-        except:
-            completed = 0
+        # Convert numeric values safely; counts are plain digits, so an isdecimal()
+        # guard replaces raising and catching on empty or missing fields
+        seeders = int(seeders) if seeders.isdecimal() else 0
+        leechers = int(leechers) if leechers.isdecimal() else 0
+        completed = int(completed) if completed.isdecimal() else 0
 
         size_in_bytes = self.size_utils.size_to_bytes(size_str)
 
-        timestamp = None
+        # Dates look like "2023-11-14 22:13 UTC"; slicing the fields out is far
+        # cheaper than strptime, and timegm reads them as the UTC they are
         try:
-            dt_str = date_str.replace(" UTC", "")
-            dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-            timestamp = int(dt.timestamp())
-        except:
-            timestamp = int(datetime.now().timestamp())
+            timestamp = calendar.timegm((
+                int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]),
+                int(date_str[11:13]), int(date_str[14:16]), 0, 0, 0, 0
+            ))
+        except (ValueError, TypeError):
+            timestamp = int(time.time())
 
         return {
             "title": title,
@@ -69,4 +149,22 @@ class NyaaService:
             "size_bytes": size_in_bytes,
             "completed": completed,
             "timestamp": timestamp,
-        }
\ No newline at end of file
+        }
+
+    def _select_fields(self, html: str) -> tuple:
+        """Extract the info panel fields with CSS selectors"""
+        # lxml is already a dependency and parses far faster than the pure-Python html.parser
+        soup = BeautifulSoup(html, "lxml")
+
+        def get_text(selector):
+            el = soup.select_one(selector)
+            return el.text.strip() if el else ""
+
+        return (
+            get_text("body > div > div:nth-child(1) > div.panel-heading > h3"),
+            get_text("div.row:nth-child(1) > div:nth-child(4)"),
+            get_text("div.row:nth-child(2) > div:nth-child(4) > span:nth-child(1)"),
+            get_text("div.row:nth-child(3) > div:nth-child(4) > span:nth-child(1)"),
+            get_text("div.row:nth-child(4) > div:nth-child(2)"),
+            get_text("div.row:nth-child(4) > div:nth-child(4)"),
+        )
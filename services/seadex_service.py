@@ -1,44 +1,68 @@
-import requests
 import logging
+import orjson
+from utils.http_session import get_session
 
 logger = logging.getLogger(__name__)
 
 class SeadexService:
-    def __init__(self):
+    def __init__(self, per_page=200):
         self.base_url = "https://releases.moe/api/collections/entries/records"
+        self.per_page = per_page
+        self.timeout = (3, 10)  # (connect, read) seconds
+
+    def _fetch_entries(self, anilist_ids):
+        """Fetch the entry records for all AniList IDs with a single OR filter, following pagination"""
+        # PocketBase filters support disjunctions, so the whole fan-out is one query
+        params = {
+            'filter': '(' + '||'.join(f'alID={anilist_id}' for anilist_id in anilist_ids) + ')',
+            'expand': 'trs',
+            'perPage': self.per_page,
+            'page': 1
+        }
+        items = []
+
+        while True:
+            res = get_session().get(self.base_url, params=params, timeout=self.timeout)
+            if res.status_code != 200:
+                logger.error(f"Failed to fetch releases for IDs {list(anilist_ids)} (page {params['page']}): HTTP {res.status_code}")
+                break
+
+            data = orjson.loads(res.content)
+            items.extend(data.get("items", []))
+
+            if params['page'] >= data.get("totalPages", 1):
+                break
+            params['page'] += 1
+
+        return items
 
     def get_all_releases(self, anilist_ids):
         """Get releases for multiple AniList IDs"""
+        if not anilist_ids:
+            return []
+
+        try:
+            items = self._fetch_entries(anilist_ids)
+        except Exception as e:
+            logger.error(f"Error fetching releases for IDs {list(anilist_ids)}: {e}")
+            return []
+
+        # Group by the ID each entry belongs to, then emit in anilist_ids order
+        # so the main entry's torrents stay first
+        torrents_by_id = {anilist_id: [] for anilist_id in anilist_ids}
+        for item in items:
+            anilist_id = item.get("alID")
+            trs = item.get("expand", {}).get("trs", [])
+            # Add the AniList ID to each torrent for tracking
+            for torrent in trs:
+                torrent['source_anilist_id'] = anilist_id
+            torrents_by_id.setdefault(anilist_id, []).extend(trs)
+
         all_torrents = []
-        
-        for anilist_id in anilist_ids:
-            url = f"{self.base_url}?filter=alID={anilist_id}&expand=trs"
-            logger.debug(f"Fetching releases for AniList ID: {anilist_id}")
-            
-            try:
-                res = requests.get(url)
-                if res.status_code != 200:
-                    logger.error(f"Failed to fetch releases for ID {anilist_id}: HTTP {res.status_code}")
-                    continue
-                
-                data = res.json()
-                
-                items = data.get("items", [])
-                if not items:
-                    logger.debug(f"No items found for AniList ID: {anilist_id}")
-                    continue
-                
-                # Extract all torrents from all entries for this ID
-                for item in items:
-                    trs = item.get("expand", {}).get("trs", [])
-                    # Add the AniList ID to each torrent for tracking
-                    for torrent in trs:
-                        torrent['source_anilist_id'] = anilist_id
-                    all_torrents.extend(trs)
-                    
-            except Exception as e:
-                logger.error(f"Error fetching releases for ID {anilist_id}: {e}")
-                continue
-        
-        logger.debug(f"Found {len(all_torrents)} total torrent records across all related anime")
-        return all_torrents
\ No newline at end of file
+        for anilist_id, torrents in torrents_by_id.items():
+            if not torrents:
+                logger.debug("No items found for AniList ID: %s", anilist_id)
+            all_torrents.extend(torrents)
+
+        logger.debug("Found %s total torrent records across all related anime", len(all_torrents))
+        return all_torrents
@@ -4,157 +4,170 @@ from utils.episode_utils import EpisodeUtils
 
 logger = logging.getLogger(__name__)
 
+# Compiled once at import; these run for every file of every torrent.
+# Nyaa URLs are plain ASCII, so the ID pattern skips Unicode digit classes
+NYAA_ID_RE = re.compile(r"nyaa\.si/view/(\d+)", re.ASCII)
+# Season/episode markers which mean a torrent is NOT a movie, as one alternation
+SEASON_EPISODE_RE = re.compile(
+    r'S\d+|Season \d+'  # Season indicators
+    r'|E\d+|Episode \d+'  # Episode indicators
+    r'|Complete Series|Season Pack',
+    re.IGNORECASE
+)
+# AniList formats that are never movies, whatever their file names say
+NON_MOVIE_FORMATS = frozenset(("TV", "TV_SHORT", "OVA", "ONA", "SPECIAL"))
+# Explicit movie keywords
+MOVIE_RE = re.compile(r'movie|film|gekijo|theatrical|cinema|feature', re.IGNORECASE)
+
+def matches_season_episode(torrent, season=None, episode=None):
+    """Whether a processed torrent covers the requested season and episode"""
+    # Season filtering
+    if season and torrent.get('season') != season:
+        # Check if it's a season pack that includes the requested season
+        if not (torrent.get('is_season_pack') and season in torrent.get('seasons', ())):
+            return False
+    
+    # Episode filtering
+    if episode:
+        episode_numbers = torrent.get('episode_numbers', ())
+        if episode_numbers and episode not in episode_numbers:
+            return False
+    
+    return True
+
 class TorrentProcessor:
     def __init__(self):
         self.episode_utils = EpisodeUtils()
 
-    def is_movie_torrent(self, torrent_info, anime_format=None):
-        """Determine if a torrent is for a movie based on stricter indicators"""
-        
-        # If we know from AniList that it's a movie format, trust it
-        if anime_format == "MOVIE":
-            return True
-            
-        # First check for season/episode indicators which would indicate it's NOT a movie
-        season_episode_indicators = [
-            r'S\d+', r'Season \d+',  # Season indicators
-            r'E\d+', r'Episode \d+',  # Episode indicators
-            r'Complete Series',
-            r'Season Pack'
-        ]
-        
-        for file_info in torrent_info.get('files', []):
-            filename = file_info.get('name', '').lower()
-            # If any file has season/episode markers, it's not a movie
-            if any(re.search(pattern, filename, re.IGNORECASE) for pattern in season_episode_indicators):
-                return False
-        
-        # Check file patterns for explicit movie indicators
-        movie_indicators = [
-            'movie', 'film', 'gekijo', 'gekijou', 'gekijouban',
-            'theatrical', 'cinema', 'feature'
-        ]
-        
-        for file_info in torrent_info.get('files', []):
-            filename = file_info.get('name', '').lower()
-            # Check for explicit movie keywords
-            if any(indicator in filename for indicator in movie_indicators):
-                return True
-        
-        # Don't use file size as an indicator anymore as it's unreliable
-        return False
-
     def process_seadex_torrents(self, torrents, season_filter=None, episode_filter=None, anime_format=None):
         """Process Seadex torrent data using groupedUrl to determine release type"""
         processed_torrents = []
         
+        # The format is the same for every torrent and file, so decide once:
+        # known movies need neither indicators nor episode info, and known
+        # non-movie formats skip the indicator regexes
+        is_movie_format = anime_format == "MOVIE"
+        check_indicators = anime_format not in NON_MOVIE_FORMATS
+        
         for torrent in torrents:
-            url = torrent.get("url", "")
-            grouped_url = torrent.get("groupedUrl", "")
-            
-            # Skip non-Nyaa torrents
-            if "nyaa.si/view/" not in url:
-                logger.debug(f"Skipping non-nyaa torrent: {url}")
+            torrent_info = self._process_torrent(torrent, anime_format, is_movie_format, check_indicators)
+            if torrent_info is None:
                 continue
             
-            # Extract nyaa ID
-            match = re.search(r"nyaa.si/view/(\d+)", url)
-            if not match:
-                logger.debug(f"Could not extract nyaa ID from: {url}")
+            # Apply filters based on release type
+            if (season_filter or episode_filter) and not matches_season_episode(torrent_info, season_filter, episode_filter):
                 continue
             
-            nyaa_id = int(match.group(1))
-            
-            # Enhanced release type detection
-            is_movie = self.is_movie_torrent(torrent, anime_format)
-            
-            if grouped_url == "" or grouped_url is None:
-                is_season_pack = True
-                logger.debug(f"Torrent {nyaa_id} identified as season pack (empty groupedUrl)")
-            else:
-                is_season_pack = False
-                logger.debug(f"Torrent {nyaa_id} identified as individual episode (groupedUrl: {grouped_url})")
+            processed_torrents.append(torrent_info)
+            release_type = "movie" if torrent_info['is_movie'] else ("season pack" if torrent_info['is_season_pack'] else "individual episode")
+            logger.debug("Including %s: Season %s, Episodes: %s", release_type, torrent_info['season'], torrent_info['episode_numbers'])
+        
+        return processed_torrents
+
+    def _process_torrent(self, torrent, anime_format, is_movie_format, check_indicators):
+        """Process a single Seadex torrent; None if it isn't a Nyaa torrent"""
+        url = torrent.get("url", "")
+        grouped_url = torrent.get("groupedUrl", "")
+        
+        # Skip non-Nyaa torrents; the ID match doubles as the Nyaa URL check
+        match = NYAA_ID_RE.search(url)
+        if not match:
+            logger.debug("Skipping non-nyaa torrent: %s", url)
+            return None
+        
+        nyaa_id = int(match.group(1))
+        
+        files = torrent.get('files', [])
+        total_size = sum(file_info.get('length', 0) for file_info in files)
+        has_season_episode = False
+        has_movie_keyword = False
+        episode_files = 0
+        seasons_found = set()
+        episodes_found = set()
+        
+        # One pass over the files collects episode info and the movie
+        # indicators together; known movies need neither
+        extract_episode_info = self.episode_utils.extract_episode_info
+        for file_info in (() if is_movie_format else files):
+            filename = file_info.get('name', '')
             
-            # Override season pack detection for movies
-            if is_movie:
-                is_season_pack = False
-                logger.debug(f"Torrent {nyaa_id} identified as movie")
+            if check_indicators and not has_season_episode:
+                if SEASON_EPISODE_RE.search(filename):
+                    has_season_episode = True
+                elif not has_movie_keyword:
+                    has_movie_keyword = MOVIE_RE.search(filename) is not None
             
-            # Get basic torrent info
-            torrent_info = {
-                'nyaa_id': nyaa_id,
-                'url': url,
-                'grouped_url': grouped_url,
-                'release_group': torrent.get('releaseGroup', ''),
-                'dual_audio': torrent.get('dualAudio', False),
-                'is_best': torrent.get('isBest', False),
-                'info_hash': torrent.get('infoHash', ''),
-                'files': torrent.get('files', []),
-                'tracker': torrent.get('tracker', 'Nyaa'),
-                'is_season_pack': is_season_pack,
-                'is_movie': is_movie,
-                'anime_format': anime_format,
-                'episodes': [],
-                'source_anilist_id': torrent.get('source_anilist_id')
-            }
+            # Extract episode info from filename
+            season_num, episode_num = extract_episode_info(filename)
             
-            # Process files to extract episode information
-            total_size = 0
-            episode_count = 0
+            if episode_num:
+                episode_files += 1
+                episodes_found.add(episode_num)
+                if season_num:
+                    seasons_found.add(season_num)
+        
+        # Enhanced release type detection: season/episode markers in any file mean
+        # it's NOT a movie, otherwise explicit movie keywords do (file size is unreliable)
+        is_movie = is_movie_format or (has_movie_keyword and not has_season_episode)
+        
+        # For movies, don't use episode info
+        if is_movie:
+            episode_count = len(files)
             seasons_found = set()
             episodes_found = set()
-            
-            for file_info in torrent.get('files', []):
-                filename = file_info.get('name', '')
-                file_size = file_info.get('length', 0)
-                total_size += file_size
-                
-                # For movies, don't try to extract episode info
-                if is_movie:
-                    episode_count += 1
-                else:
-                    # Extract episode info from filename
-                    season_num, episode_num = self.episode_utils.extract_episode_info(filename)
-                    
-                    if episode_num:
-                        episode_count += 1
-                        episodes_found.add(episode_num)
-                        if season_num:
-                            seasons_found.add(season_num)
-                        
-                        # Store episode info
-                        torrent_info['episodes'].append({
-                            'filename': filename,
-                            'season': season_num,
-                            'episode': episode_num,
-                            'size': file_size
-                        })
-            
-            # Set torrent metadata
-            torrent_info['total_size'] = total_size
-            torrent_info['episode_count'] = episode_count
-            torrent_info['seasons'] = list(seasons_found)
-            torrent_info['episode_numbers'] = list(episodes_found)
-            
-            # Set season/episode info based on release type
-            if is_movie:
-                torrent_info['season'] = None
-                torrent_info['episode'] = None
-            elif is_season_pack:
-                # Season pack - contains multiple episodes
-                torrent_info['season'] = list(seasons_found)[0] if seasons_found else 1
-                torrent_info['episode'] = None  # Season packs don't have a single episode
-            else:
-                # Individual episode
-                torrent_info['season'] = list(seasons_found)[0] if seasons_found else 1
-                torrent_info['episode'] = list(episodes_found)[0] if episodes_found else None
-            
-            # Apply filters based on release type
-            should_include = True
-            
-            if should_include:
-                processed_torrents.append(torrent_info)
-                release_type = "movie" if is_movie else ("season pack" if is_season_pack else "individual episode")
-                logger.debug(f"Including {release_type}: Season {torrent_info['season']}, Episodes: {torrent_info['episode_numbers']}")
+        else:
+            episode_count = episode_files
         
-        return processed_torrents
+        if grouped_url == "" or grouped_url is None:
+            is_season_pack = True
+            logger.debug("Torrent %s identified as season pack (empty groupedUrl)", nyaa_id)
+        else:
+            is_season_pack = False
+            logger.debug("Torrent %s identified as individual episode (groupedUrl: %s)", nyaa_id, grouped_url)
+        
+        # Override season pack detection for movies
+        if is_movie:
+            is_season_pack = False
+            logger.debug("Torrent %s identified as movie", nyaa_id)
+        
+        # Set season/episode info based on release type; set order isn't defined,
+        # so take the lowest rather than whichever comes out first
+        if is_movie:
+            season = None
+            episode = None
+        elif is_season_pack:
+            # Season pack - contains multiple episodes
+            season = min(seasons_found, default=1)
+            episode = None  # Season packs don't have a single episode
+        else:
+            # Individual episode
+            season = min(seasons_found, default=1)
+            episode = min(episodes_found, default=None)
+        
+        # Built in one go with every final value, rather than grown key by key
+        torrent_info = {
+            'nyaa_id': nyaa_id,
+            'url': url,
+            'grouped_url': grouped_url,
+            'release_group': torrent.get('releaseGroup', ''),
+            'dual_audio': torrent.get('dualAudio', False),
+            'is_best': torrent.get('isBest', False),
+            'info_hash': torrent.get('infoHash', ''),
+            'files': files,
+            'tracker': torrent.get('tracker', 'Nyaa'),
+            'is_season_pack': is_season_pack,
+            'is_movie': is_movie,
+            'anime_format': anime_format,
+            'source_anilist_id': torrent.get('source_anilist_id'),
+            'total_size': total_size,
+            'episode_count': episode_count,
+            # Sets, since filtering only ever tests membership
+            'seasons': frozenset(seasons_found),
+            'episode_numbers': frozenset(episodes_found),
+            # (first, last) for feed titles, so they needn't rescan the set
+            'episode_range': (min(episodes_found), max(episodes_found)) if episodes_found else None,
+            'season': season,
+            'episode': episode
+        }
+        
+        return torrent_info
@@ -1,18 +1,45 @@
-import xml.etree.ElementTree as ET
 import logging
 import re
-from datetime import datetime
+import time
+from email.utils import formatdate
+from functools import lru_cache
+from xml.sax.saxutils import escape
 from services.nyaa_service import NyaaService
 
 logger = logging.getLogger(__name__)
 
-class XMLService:
-    def __init__(self):
-        self.nyaa_service = NyaaService()
+# Newznab (name, id) of the two categories we serve; caps advertises the same pair
+ANIME_CATEGORY = ("Anime", "5000")
+MOVIES_CATEGORY = ("Movies", "2000")
 
-    def build_caps_xml(self):
-        """Build capabilities XML response"""
-        return '''<?xml version="1.0" encoding="UTF-8"?>
+# Episode markers already in a Nyaa title, so we don't tag it twice
+EPISODE_TAG_RE = re.compile(r'E\d+|Episode\s+\d+', re.IGNORECASE)
+
+# Extra escapes for attribute values, so whitespace survives attribute normalization
+ATTR_ENTITIES = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'}
+
+# Characters XML 1.0 can't represent at all, even escaped; Nyaa titles occasionally carry them
+XML_ILLEGAL_RE = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+# Opening of each torznab attribute the renderer writes, up to its value
+TORZNAB_ATTR_OPEN = {
+    name: f'<torznab:attr name="{name}" value="'
+    for name in ("category", "infohash", "downloadvolumefactor", "uploadvolumefactor", "seeders", "peers",
+                 "size", "files", "grabs", "genre", "season", "episode", "details", "group", "anilist_id")
+}
+
+# Every namespace is declared on the root so items can use the prefixes directly
+RSS_XMLNS = (
+    'xmlns:atom="http://www.w3.org/2005/Atom" '
+    'xmlns:newznab="http://www.newznab.com/DTD/2010/feeds/attributes/" '
+    'xmlns:torznab="http://torznab.com/schemas/2015/feed"'
+)
+
+# Streamed feeds are written as strings; the opening of the document is encoded once
+RSS_OPEN = f'<?xml version="1.0" encoding="UTF-8"?>\n<rss version="1.0" {RSS_XMLNS}><channel>'.encode('utf-8')
+
+# The caps document never changes, so it is encoded once and served as bytes
+CAPS_XML = '''<?xml version="1.0" encoding="UTF-8"?>
 <caps>
   <server version="1.0" title="SeadexNab" strapline="Anime releases with the best video+subs" url="https://seadexnab.moe/"/>
   <limits max="9999" default="100"/>
@@ -27,167 +54,223 @@ class XMLService:
     <category id="5000" name="Anime" description="Anime TV Shows"/>
     <category id="2000" name="Movies" description="Anime Movies"/>
   </categories>
-</caps>'''
+</caps>'''.encode('utf-8')
 
-    def build_empty_rss(self, title="SeadexNab", description="No results found"):
-        """Build empty RSS response"""
-        return f'''<?xml version="1.0" encoding="UTF-8"?>
-<rss version="1.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:newznab="http://www.newznab.com/DTD/2010/feeds/attributes/" xmlns:torznab="http://torznab.com/schemas/2015/feed">
+def _escape(text, entities=None):
+    """Escape text for XML, dropping characters XML can't carry"""
+    return escape(XML_ILLEGAL_RE.sub('', text), entities or {})
+
+@lru_cache(maxsize=256)
+def _build_empty_rss(title, description):
+    """Encode an empty RSS feed; cached since pollers repeat the same misses"""
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="1.0" {RSS_XMLNS}>
 <channel>
-    <title>{title}</title>
+    <title>{_escape(title)}</title>
     <link>https://releases.moe</link>
-    <description>{description}</description>
+    <description>{_escape(description)}</description>
     <newznab:response offset="0" total="0"/>
 </channel>
-</rss>'''
-
-    def build_rss_enhanced(self, anilist_id, anime_name, processed_torrents, season=None, episode=None, 
-                           anime_format=None, year=None, force_anime_category=False):
-        """Enhanced RSS builder with custom name support"""
-        logger.debug(f"Building RSS for {anime_name} ({anime_format}) with {len(processed_torrents)} torrents, force_anime_category={force_anime_category}")
-        
-        rss = ET.Element("rss", version="1.0", attrib={
-            "xmlns:atom": "http://www.w3.org/2005/Atom",
-            "xmlns:newznab": "http://www.newznab.com/DTD/2010/feeds/attributes/",
-            "xmlns:torznab": "http://torznab.com/schemas/2015/feed"
-        })
-        
-        channel = ET.SubElement(rss, "channel")
-        title_text = f"SeadexNab - {anime_name}"
-        if season:
-            title_text += f" - Season {season}"
-        if episode:
-            title_text += f" Episode {episode}"
-        if anime_format == "MOVIE" and year:
-            title_text += f" ({year}) [Movie]"
-        
-        ET.SubElement(channel, "title").text = title_text
-        ET.SubElement(channel, "link").text = "https://releases.moe"
-        ET.SubElement(channel, "description").text = f"Torrents for {anime_name} and related anime from releases.moe"
+</rss>'''.encode('utf-8')
 
-        valid_torrents = 0
-        for torrent_info in processed_torrents:
-            nyaa_id = torrent_info['nyaa_id']
-            
-            # Check if this is a custom mapped torrent
-            is_custom = torrent_info.get('is_custom_mapping', False)
+class XMLService:
+    def __init__(self):
+        self.nyaa_service = NyaaService()
+
+    def build_caps_xml(self):
+        """Get the capabilities XML response"""
+        return CAPS_XML
+
+    def build_empty_rss(self, title="SeadexNab", description="No results found"):
+        """Build empty RSS response"""
+        return _build_empty_rss(title, description)
+
+    def _channel_title(self, anime_name, season=None, episode=None, anime_format=None, year=None):
+        """Title of the feed channel"""
+        season_part = f" - Season {season}" if season else ""
+        episode_part = f" Episode {episode}" if episode else ""
+        movie_part = f" ({year}) [Movie]" if anime_format == "MOVIE" and year else ""
+        return f"SeadexNab - {anime_name}{season_part}{episode_part}{movie_part}"
+
+    def _render_channel_header(self, anime_name, season=None, episode=None, anime_format=None, year=None):
+        """Render the channel title, link and description as a string fragment"""
+        return (
+            f"<title>{_escape(self._channel_title(anime_name, season, episode, anime_format, year))}</title>"
+            "<link>https://releases.moe</link>"
+            f"<description>{_escape(f'Torrents for {anime_name} and related anime from releases.moe')}</description>"
+        )
+
+    def _fetch_metadata(self, processed_torrents):
+        """Fetch Nyaa metadata for all torrents concurrently, in torrent order"""
+        return self.nyaa_service.fetch_nyaa_metadata_many([torrent_info['nyaa_id'] for torrent_info in processed_torrents])
+
+    def _item_fields(self, torrent_info, nyaa_metadata, anilist_id, anime_name, anime_format=None, force_anime_category=False):
+        """Work out the RSS item for a processed torrent and its Nyaa metadata.
+        
+        Returns (title, link, description, download_url, size, category, pub_date, attrs)
+        where attrs is the ordered list of torznab (name, value) attributes, or None
+        when the size of a SeaDex torrent is unknown, which Sonarr/Radarr would reject anyway.
+        """
+        nyaa_id = torrent_info['nyaa_id']
+        
+        # Check if this is a custom mapped torrent
+        is_custom = torrent_info.get('is_custom_mapping', False)
+        # Decides the description tag, category and attributes below
+        is_movie = torrent_info.get('is_movie') or anime_format == "MOVIE"
+        
+        # Fall back to what we already know if Nyaa couldn't be reached
+        if not nyaa_metadata:
+            nyaa_metadata = {
+                "title": torrent_info.get('custom_name', f"{anime_name} - {torrent_info['release_group']}"),
+                "seeders": 0,
+                "leechers": 0,
+                "size_bytes": torrent_info.get('total_size', 0),
+                "completed": 0,
+                "timestamp": int(time.time()),
+            }
+        
+        # Nyaa's page may not have had a parseable size; the torrent's own total will do
+        size_bytes = nyaa_metadata["size_bytes"] or torrent_info.get('total_size', 0)
+        # Custom mapping torrents carry no size of their own, so they're always
+        # listed (with size 0) rather than vanish whenever a Nyaa fetch fails
+        if not size_bytes and not is_custom:
+            logger.debug("Skipping torrent %s with unknown size", nyaa_id)
+            return None
+
+        # Use custom name if available (it already contains all info)
+        if torrent_info.get('custom_name'):
+            title = torrent_info['custom_name']
+        else:
+            # Keep original Nyaa title but ensure compatibility with Sonarr/Radarr
+            title = nyaa_metadata["title"]
             
-            # Fetch additional metadata from Nyaa
-            nyaa_metadata = self.nyaa_service.fetch_nyaa_metadata(nyaa_id)
-            if not nyaa_metadata:
-                nyaa_metadata = {
-                    "title": torrent_info.get('custom_name', f"{anime_name} - {torrent_info['release_group']}"),
-                    "seeders": 0,
-                    "leechers": 0,
-                    "size_bytes": torrent_info.get('total_size', 0),
-                    "completed": 0,
-                    "timestamp": int(datetime.now().timestamp()),
-                }
-
-            # Use custom name if available (it already contains all info)
-            if torrent_info.get('custom_name'):
-                title = torrent_info['custom_name']
-            else:
-                # Keep original Nyaa title but ensure compatibility with Sonarr/Radarr
-                title = nyaa_metadata["title"]
-                
-                # Add minimal required tags if they're not already present
-                # This is needed for Sonarr/Radarr to properly identify releases
-                if not any(marker in title for marker in ['[E', '[S', '[Season', '[Episode']):
-                    if torrent_info.get('is_season_pack'):
-                        season_num = torrent_info.get('season', 1)
-                        if torrent_info.get('episode_numbers'):
-                            # Only append episode info if it's not already in the title
-                            if not re.search(r'E\d+|Episode\s+\d+', title, re.IGNORECASE):
-                                episodes_str = f"E{min(torrent_info['episode_numbers'])}-{max(torrent_info['episode_numbers'])}"
-                                title += f" [S{season_num:02d}{episodes_str}]"
-                    elif torrent_info.get('episode'):
+            # Add minimal required tags if they're not already present
+            # This is needed for Sonarr/Radarr to properly identify releases
+            # ('[Season' and '[Episode' start with these too)
+            if '[E' not in title and '[S' not in title:
+                if torrent_info.get('is_season_pack'):
+                    season_num = torrent_info.get('season', 1)
+                    episode_range = torrent_info.get('episode_range')
+                    if episode_range:
                         # Only append episode info if it's not already in the title
-                        if not re.search(r'E\d+|Episode\s+\d+', title, re.IGNORECASE):
-                            title += f" [S{torrent_info.get('season', 1):02d}E{torrent_info['episode']:02d}]"
+                        if not EPISODE_TAG_RE.search(title):
+                            first_episode, last_episode = episode_range
+                            title += f" [S{season_num:02d}E{first_episode}-{last_episode}]"
+                elif torrent_info.get('episode'):
+                    # Only append episode info if it's not already in the title
+                    if not EPISODE_TAG_RE.search(title):
+                        title += f" [S{torrent_info.get('season', 1):02d}E{torrent_info['episode']:02d}]"
 
-            item = ET.SubElement(channel, "item")
-            ET.SubElement(item, "title").text = title
-            ET.SubElement(item, "link").text = torrent_info['url']
-            ET.SubElement(item, "guid", isPermaLink="true").text = torrent_info['url']
-            
-            # Build description
-            description = f"{title} - {nyaa_metadata.get('size', 'Unknown size')} - S:{nyaa_metadata['seeders']} L:{nyaa_metadata['leechers']}"
-            if torrent_info.get('dual_audio'):
-                description += " [Dual Audio]"
-            if torrent_info.get('is_best'):
-                description += " [Best]"
-            if is_custom:
-                description += " [Custom]"
-            if torrent_info.get('is_movie') or anime_format == "MOVIE":
-                description += " [Movie]"
-            elif torrent_info.get('is_season_pack'):
-                description += " [Season Pack]"
-            
-            # Add source anime info if different from main
-            source_id = torrent_info.get('source_anilist_id')
-            if source_id and source_id != anilist_id:
-                description += f" [Related Anime: {source_id}]"
-                
-            ET.SubElement(item, "description").text = description
-            
-            # Download and torrent info
-            download_url = f"https://nyaa.si/download/{nyaa_id}.torrent"
-            ET.SubElement(item, "enclosure", url=download_url, type="application/x-bittorrent")
-            ET.SubElement(item, "comments").text = torrent_info['url']
-            ET.SubElement(item, "size").text = str(nyaa_metadata["size_bytes"])
-            
-            # Assign category based on torrent type and force_anime_category flag
-            if force_anime_category or not (torrent_info.get('is_movie') or anime_format == "MOVIE"):
-                # TV Series or forced anime category
-                ET.SubElement(item, "category").text = "Anime"
-                category_id = "5000"
-            else:
-                # Movies
-                ET.SubElement(item, "category").text = "Movies"
-                category_id = "2000"
-            
-            ET.SubElement(item, "pubDate").text = datetime.fromtimestamp(nyaa_metadata["timestamp"]).strftime("%a, %d %b %Y %H:%M:%S GMT")
-            
-            # Torznab attributes
-            ET.SubElement(item, "torznab:attr", name="category", value=category_id)
-            if torrent_info.get('info_hash'):
-                ET.SubElement(item, "torznab:attr", name="infohash", value=torrent_info['info_hash'])
-            ET.SubElement(item, "torznab:attr", name="downloadvolumefactor", value="0")
-            ET.SubElement(item, "torznab:attr", name="uploadvolumefactor", value="1")
-            ET.SubElement(item, "torznab:attr", name="seeders", value=str(nyaa_metadata["seeders"]))
-            ET.SubElement(item, "torznab:attr", name="peers", value=str(nyaa_metadata["seeders"] + nyaa_metadata["leechers"]))
-            ET.SubElement(item, "torznab:attr", name="size", value=str(nyaa_metadata["size_bytes"]))
-                        
-            ET.SubElement(item, "torznab:attr", name="files", value=str(torrent_info.get('episode_count', 1)))
-            ET.SubElement(item, "torznab:attr", name="grabs", value=str(nyaa_metadata["completed"]))
-            
-            # Special handling for movies in attributes
-            if torrent_info.get('is_movie') or anime_format == "MOVIE":
-                ET.SubElement(item, "torznab:attr", name="genre", value="Anime Movie")
-                # Movies need season/episode for compatibility
-                ET.SubElement(item, "torznab:attr", name="season", value="1")
-                ET.SubElement(item, "torznab:attr", name="episode", value="1")
-            else:
-                if torrent_info.get('season'):
-                    ET.SubElement(item, "torznab:attr", name="season", value=str(torrent_info['season']))
-                if torrent_info.get('episode'):
-                    ET.SubElement(item, "torznab:attr", name="episode", value=str(torrent_info['episode']))
-            
-            ET.SubElement(item, "torznab:attr", name="details", value=torrent_info['url'])
-            
-            if torrent_info.get('release_group'):
-                ET.SubElement(item, "torznab:attr", name="group", value=torrent_info['release_group'])
-            
-            # Add source anime ID as additional attribute
-            if torrent_info.get('source_anilist_id'):
-                ET.SubElement(item, "torznab:attr", name="anilist_id", value=str(torrent_info['source_anilist_id']))
-            
-            valid_torrents += 1
+        # Build description, with its tags joined on in one go
+        tags = []
+        if torrent_info.get('dual_audio'):
+            tags.append(" [Dual Audio]")
+        if torrent_info.get('is_best'):
+            tags.append(" [Best]")
+        if is_custom:
+            tags.append(" [Custom]")
+        if is_movie:
+            tags.append(" [Movie]")
+        elif torrent_info.get('is_season_pack'):
+            tags.append(" [Season Pack]")
+        
+        # Add source anime info if different from main
+        source_id = torrent_info.get('source_anilist_id')
+        if source_id and source_id != anilist_id:
+            tags.append(f" [Related Anime: {source_id}]")
+        
+        description = f"{title} - {nyaa_metadata.get('size', 'Unknown size')} - S:{nyaa_metadata['seeders']} L:{nyaa_metadata['leechers']}{''.join(tags)}"
+        
+        # Assign category based on torrent type and force_anime_category flag
+        category_name, category_id = ANIME_CATEGORY if force_anime_category or not is_movie else MOVIES_CATEGORY
+        
+        # Download and torrent info
+        download_url = f"https://nyaa.si/download/{nyaa_id}.torrent"
+        # Nyaa timestamps are UTC; formatdate renders RFC 822 without strftime's locale lookups
+        pub_date = formatdate(nyaa_metadata["timestamp"], usegmt=True)
+        
+        # Torznab attributes
+        attrs = [("category", category_id)]
+        if torrent_info.get('info_hash'):
+            attrs.append(("infohash", torrent_info['info_hash']))
+        attrs.append(("downloadvolumefactor", "0"))
+        attrs.append(("uploadvolumefactor", "1"))
+        attrs.append(("seeders", str(nyaa_metadata["seeders"])))
+        attrs.append(("peers", str(nyaa_metadata["seeders"] + nyaa_metadata["leechers"])))
+        attrs.append(("size", str(size_bytes)))
+                    
+        attrs.append(("files", str(torrent_info.get('episode_count', 1))))
+        attrs.append(("grabs", str(nyaa_metadata["completed"])))
+        
+        # Special handling for movies in attributes
+        if is_movie:
+            attrs.append(("genre", "Anime Movie"))
+            # Movies need season/episode for compatibility
+            attrs.append(("season", "1"))
+            attrs.append(("episode", "1"))
+        else:
+            if torrent_info.get('season'):
+                attrs.append(("season", str(torrent_info['season'])))
+            if torrent_info.get('episode'):
+                attrs.append(("episode", str(torrent_info['episode'])))
+        
+        attrs.append(("details", torrent_info['url']))
+        
+        if torrent_info.get('release_group'):
+            attrs.append(("group", torrent_info['release_group']))
+        
+        # Add source anime ID as additional attribute
+        if torrent_info.get('source_anilist_id'):
+            attrs.append(("anilist_id", str(torrent_info['source_anilist_id'])))
+        
+        return (title, torrent_info['url'], description, download_url, str(size_bytes),
+                category_name, pub_date, attrs)
 
-        ET.SubElement(channel, "newznab:response", offset="0", total=str(valid_torrents))
+    def _render_item(self, fields):
+        """Render a single RSS item from _item_fields' result as a string fragment"""
+        title, link, description, download_url, size, category_name, pub_date, attrs = fields
+        link = _escape(link)
+        # The category is one of our constants, so it never needs escaping
+        parts = [
+            '<item>',
+            '<title>', _escape(title), '</title>',
+            '<link>', link, '</link>',
+            '<guid isPermaLink="true">', link, '</guid>',
+            '<description>', _escape(description), '</description>',
+            '<enclosure url="', _escape(download_url, ATTR_ENTITIES), '" type="application/x-bittorrent"/>',
+            '<comments>', link, '</comments>',
+            '<size>', size, '</size>',
+            '<category>', category_name, '</category>',
+            '<pubDate>', pub_date, '</pubDate>'
+        ]
+        for name, value in attrs:
+            # Most attributes are counts; only text values need escaping
+            if not value.isdecimal():
+                value = _escape(value, ATTR_ENTITIES)
+            parts += (TORZNAB_ATTR_OPEN.get(name) or f'<torznab:attr name="{name}" value="', value, '"/>')
+        parts.append('</item>')
+        return ''.join(parts)
+
+
+    def build_rss_enhanced_stream(self, anilist_id, anime_name, processed_torrents, season=None, episode=None,
+                                  anime_format=None, year=None, force_anime_category=False):
+        """Enhanced RSS builder with custom name support, yielding the feed one item at a time.
+        
+        The feed is linear, so it is written straight from string fragments rather
+        than built as a tree.
+        """
+        logger.debug("Streaming RSS for %s (%s) with %s torrents, force_anime_category=%s", anime_name, anime_format, len(processed_torrents), force_anime_category)
+        
+        yield RSS_OPEN + self._render_channel_header(anime_name, season, episode, anime_format, year).encode('utf-8')
+        
+        valid_torrents = 0
+        # Items still go out in order as soon as each one's metadata arrives
+        for torrent_info, nyaa_metadata in zip(processed_torrents, self._fetch_metadata(processed_torrents)):
+            fields = self._item_fields(torrent_info, nyaa_metadata, anilist_id, anime_name, anime_format, force_anime_category)
+            if fields is None:
+                continue
+            yield self._render_item(fields).encode('utf-8')
+            valid_torrents += 1
         
-        logger.debug(f"Built RSS with {valid_torrents} valid torrents")
-        xml_str = ET.tostring(rss, encoding='utf-8').decode('utf-8')
-        xml_str = '<?xml version="1.0" encoding="UTF-8"?>\n' + xml_str
-        return xml_str
+        logger.debug("Streamed RSS with %s valid torrents", valid_torrents)
+        yield f'<newznab:response offset="0" total="{valid_torrents}"/></channel></rss>'.encode('utf-8')
@@ -0,0 +1,123 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import orjson
+import requests
+
+from services.mapping_service import MappingService, _normalize_search_term
+
+# A small alphabet so random terms and queries overlap often, with spaces and
+# punctuation to exercise normalization
+ALPHABET = "abc -!"
+
+def _random_text(rng, max_length):
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_length)))
+
+def _linear_find(mappings, query, skip_empty=False):
+    """The original lookup: a direct match, else the first indexed term either side of a substring test.
+
+    With skip_empty, blank queries and terms that normalize to '' never match,
+    which is what MappingService does on purpose.
+    """
+    search_index = {}
+    for primary_key, mapping_data in mappings.items():
+        for term in (primary_key, *mapping_data.get('also_search', ())):
+            search_index[_normalize_search_term(term)] = primary_key
+    
+    normalized_query = _normalize_search_term(query)
+    if skip_empty:
+        search_index.pop('', None)
+        if not normalized_query:
+            return None
+    if normalized_query in search_index:
+        return mappings[search_index[normalized_query]]
+    for indexed_term, primary_key in search_index.items():
+        if indexed_term in normalized_query or normalized_query in indexed_term:
+            return mappings[primary_key]
+    return None
+
+def _key(mapping):
+    return mapping and mapping['key']
+
+class FindMappingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        mapping_path = os.path.join(self.tmpdir.name, 'mapping.json')
+        with open(mapping_path, 'wb') as f:
+            f.write(orjson.dumps({'mappings': {}}))
+        # Offline, so the service falls back to the local file
+        offline = mock.Mock()
+        offline.get.side_effect = requests.exceptions.ConnectionError("offline")
+        with mock.patch('services.mapping_service.get_session', return_value=offline):
+            self.service = MappingService(mapping_file_path=mapping_path)
+    
+    def _load(self, mappings):
+        self.service._load_mapping_bytes(orjson.dumps({'mappings': mappings}))
+    
+    def _random_mappings(self, rng, allow_empty_terms):
+        mappings = {}
+        for i in range(rng.randint(1, 12)):
+            terms = [_random_text(rng, 10) for _ in range(rng.randint(1, 3))]
+            if not allow_empty_terms:
+                terms = [term for term in terms if _normalize_search_term(term)]
+            if terms and terms[0] not in mappings:
+                mappings[terms[0]] = {'key': i, 'also_search': terms[1:]}
+        return mappings
+    
+    def _queries(self, rng, mappings):
+        queries = [_random_text(rng, 14) for _ in range(30)]
+        # Pieces of and additions to indexed terms hit the partial match paths
+        for primary_key in mappings:
+            term = _normalize_search_term(primary_key)
+            start = rng.randint(0, len(term))
+            queries.append(term[start:rng.randint(start, len(term))])
+            queries.append(f"{_random_text(rng, 4)}{term}{_random_text(rng, 4)}")
+        return queries
+    
+    def test_matches_linear_scan_for_non_empty_terms(self):
+        rng = random.Random(1234)
+        for _ in range(200):
+            mappings = self._random_mappings(rng, allow_empty_terms=False)
+            self._load(mappings)
+            for query in self._queries(rng, mappings):
+                if not _normalize_search_term(query):
+                    continue
+                with self.subTest(mappings=list(mappings), query=query):
+                    self.assertEqual(_key(self.service.find_mapping(query)), _key(_linear_find(mappings, query)))
+    
+    def test_differs_only_where_a_term_normalizes_to_empty(self):
+        rng = random.Random(5678)
+        differences = 0
+        for _ in range(200):
+            mappings = self._random_mappings(rng, allow_empty_terms=True)
+            self._load(mappings)
+            for query in self._queries(rng, mappings):
+                with self.subTest(mappings=list(mappings), query=query):
+                    actual = _key(self.service.find_mapping(query))
+                    self.assertEqual(actual, _key(_linear_find(mappings, query, skip_empty=True)))
+                    if actual != _key(_linear_find(mappings, query)):
+                        differences += 1
+                        self.assertTrue('' in self.service.search_index or not _normalize_search_term(query))
+        # Otherwise the random data never reached the cases this test is about
+        self.assertGreater(differences, 0)
+    
+    def test_blank_query_and_empty_term_never_match(self):
+        mappings = {
+            '!!!': {'key': 'punctuation'},
+            'frieren': {'key': 'frieren', 'also_search': ['sousou no frieren']}
+        }
+        self._load(mappings)
+        # A plain substring scan hands these to the term that normalized to ''
+        self.assertEqual(_key(_linear_find(mappings, 'one piece')), 'punctuation')
+        self.assertEqual(_key(_linear_find(mappings, ' ?! ')), 'punctuation')
+        self.assertIsNone(self.service.find_mapping('one piece'))
+        self.assertIsNone(self.service.find_mapping(' ?! '))
+        self.assertEqual(_key(self.service.find_mapping('Sousou no Frieren S2')), 'frieren')
+        self.assertEqual(_key(self.service.find_mapping('frie')), 'frieren')
+
+if __name__ == '__main__':
+    unittest.main()
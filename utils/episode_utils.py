@@ -1,25 +1,29 @@
 import re
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+# Common patterns for episode numbering, compiled once at import and tried in
+# order, most reliable first; this runs for every file of every torrent
+EPISODE_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'S(\d+)E(\d+)',  # S01E01
+    r'Season\s*(\d+).*?E(\d+)',  # Season 1 E01
+    r'(\d+)x(\d+)',  # 1x01
+    r'S(\d+).*?(\d+)',  # S01 01 (less reliable)
+    r'E(\d+)',  # Just E01 (episode only)
+    r'Episode\s*(\d+)',  # Episode 01
+    r'Ep\.?\s*(\d+)',  # Ep. 01 or Ep 01
+    r'(\d+)',  # Just a number (least reliable)
+))
+
 class EpisodeUtils:
-    def extract_episode_info(self, filename):
-        """Extract season and episode info from filename"""
-        # Common patterns for episode numbering
-        patterns = [
-            r'S(\d+)E(\d+)',  # S01E01
-            r'Season\s*(\d+).*?E(\d+)',  # Season 1 E01
-            r'(\d+)x(\d+)',  # 1x01
-            r'S(\d+).*?(\d+)',  # S01 01 (less reliable)
-            r'E(\d+)',  # Just E01 (episode only)
-            r'Episode\s*(\d+)',  # Episode 01
-            r'Ep\.?\s*(\d+)',  # Ep. 01 or Ep 01
-            r'(\d+)',  # Just a number (least reliable)
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, filename, re.IGNORECASE)
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def extract_episode_info(filename):
+        """Extract season and episode info from filename; cached since packs are re-processed per search"""
+        for pattern in EPISODE_PATTERNS:
+            match = pattern.search(filename)
             if match:
                 groups = match.groups()
                 if len(groups) == 2:
@@ -29,4 +33,4 @@ class EpisodeUtils:
                     # Episode only
                     return None, int(groups[0])
         
-        return None, None
\ No newline at end of file
+        return None, None
@@ -0,0 +1,42 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Get the process-wide requests.Session shared by all upstream services.
+
+    Pooled keep-alive connections to AniList, releases.moe and Nyaa are reused
+    across calls instead of paying a TCP+TLS handshake every time.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Transient gateway errors are retried too; the last response is still
+                # returned rather than raised so callers' status checks see it. 429 is
+                # left alone, since retrying only digs deeper into a rate limit
+                retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                              raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50, max_retries=retry)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+                _session = session
+    return _session
+
+def _reset_after_fork():
+    """Give a forked worker its own session instead of the parent's pooled sockets"""
+    global _session, _session_lock
+    # The parent's connections (and possibly a held lock) must not be shared with
+    # the child; a new session is built on first use
+    _session = None
+    _session_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
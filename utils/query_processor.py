@@ -1,46 +1,71 @@
 import re
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
-class QueryProcessor:
-    def process_search_query(self, query_param, season=None, episode=None):
-        """Process search query with enhanced Sonarr support and better movie handling"""
-        if not query_param:
-            return "Spirited Away"  # Default fallback
-        
-        query = str(query_param).strip()  # Ensure it's a string
-        original_query = query
-        
-        # Handle various formats that Sonarr might send
-        if ' : ' in query:
-            query = query.split(' : ')[0]
-        
-        # Remove year info like (2023) or 2021 at the end - but store it for fallback
-        year_match = re.search(r'(\d{4})', query)
+# Compiled once at import; process_search_query runs on every request
+YEAR_RE = re.compile(r'(\d{4})')
+TRAILING_PAREN_YEAR_RE = re.compile(r'\s*\(\d{4}\)$')
+TRAILING_YEAR_RE = re.compile(r'\s+\d{4}$')
+TRAILING_SEASON_RE = re.compile(r'\s+S\d+$', re.IGNORECASE)
+TRAILING_SEASON_WORD_RE = re.compile(r'\s+Season\s*\d+$', re.IGNORECASE)
+TRAILING_EPISODE_RE = re.compile(r'\s+E\d+$', re.IGNORECASE)
+TRAILING_EPISODE_WORD_RE = re.compile(r'\s+Episode\s*\d+$', re.IGNORECASE)
+# Movie keywords as one alternation ('gekijo' also covers gekijou/gekijouban)
+MOVIE_INDICATOR_RE = re.compile(r'0|movie|film|gekijo', re.IGNORECASE)
+
+@lru_cache(maxsize=4096)
+def _process_search_query(query):
+    """Clean a stripped, non-empty query string; cached since pollers repeat queries"""
+    # Every pattern below needs a digit and the split needs ' : ', so plain
+    # titles like "Bleach" are already as clean as they'll get
+    if ' : ' not in query and not any(ch.isdigit() for ch in query):
+        return query
+    
+    original_query = query
+
+    # Handle various formats that Sonarr might send
+    if ' : ' in query:
+        query = query.split(' : ')[0]
+
+    # Remove year from query; the year and movie hints are only reported in the
+    # debug log, so they're only looked for when it's enabled
+    hinted_query = query if logger.isEnabledFor(logging.DEBUG) else None
+    query = TRAILING_PAREN_YEAR_RE.sub('', query)
+    query = TRAILING_YEAR_RE.sub('', query)
+
+    # Remove season indicators from the title itself
+    query = TRAILING_SEASON_RE.sub('', query)
+    query = TRAILING_SEASON_WORD_RE.sub('', query)
+
+    # Remove episode patterns from title
+    query = TRAILING_EPISODE_RE.sub('', query)
+    query = TRAILING_EPISODE_WORD_RE.sub('', query)
+
+    query = query.strip()
+
+    if hinted_query is not None:
+        year_match = YEAR_RE.search(hinted_query)
         extracted_year = year_match.group(1) if year_match else None
-        
-        # Remove year from query
-        query = re.sub(r'\s*\(\d{4}\)$', '', query)
-        query = re.sub(r'\s+\d{4}$', '', query)
-        
-        # Remove season indicators from the title itself
-        query = re.sub(r'\s+S\d+$', '', query, flags=re.IGNORECASE)
-        query = re.sub(r'\s+Season\s*\d+$', '', query, flags=re.IGNORECASE)
-        
-        # Remove episode patterns from title
-        query = re.sub(r'\s+E\d+$', '', query, flags=re.IGNORECASE)
-        query = re.sub(r'\s+Episode\s*\d+$', '', query, flags=re.IGNORECASE)
-        
-        query = query.strip()
-        
         # Special handling for movie titles with numbers (like "Jujutsu Kaisen 0")
-        movie_indicators = ['0', 'movie', 'film', 'gekijo', 'gekijou', 'gekijouban']
-        looks_like_movie = any(indicator in query.lower() for indicator in movie_indicators)
-        
-        # Ensure we always return a non-empty string
+        looks_like_movie = MOVIE_INDICATOR_RE.search(query) is not None
+
+    # Ensure we always return a non-empty string
+    if not query:
+        query = "Spirited Away"
+
+    if hinted_query is not None:
+        logger.debug("Processed query: '%s' (original: '%s', year: %s, looks_like_movie: %s)", query, original_query, extracted_year, looks_like_movie)
+    return query
+
+class QueryProcessor:
+    @staticmethod
+    def process_search_query(query_param, season=None, episode=None):
+        """Process search query with enhanced Sonarr support and better movie handling"""
+        # Ensure it's a string; season/episode don't affect the result
+        query = str(query_param).strip() if query_param else ''
         if not query:
-            query = "Spirited Away"
-        
-        logger.debug(f"Processed query: '{query}' (original: '{original_query}', year: {extracted_year}, looks_like_movie: {looks_like_movie})")
-        return query
+            return "Spirited Away"  # Default fallback
+
+        return _process_search_query(query)
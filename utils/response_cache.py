@@ -0,0 +1,81 @@
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """In-memory cache of rendered responses with stale-while-revalidate semantics"""
+    def __init__(self, maxsize=2048, ttl=300, stale_ttl=3600):
+        # Entries are fresh for `ttl` seconds, then served stale (while being
+        # refreshed in the background) until they fall out after `stale_ttl`
+        self.ttl = ttl
+        self.entries = TTLCache(maxsize=maxsize, ttl=stale_ttl)
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="response-cache")
+
+    def get(self, key):
+        """Return (payload, mimetype, status, etag, is_stale) or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return None
+        payload, mimetype, status, etag, stored_at, ttl = entry
+        age = time.monotonic() - stored_at
+        if ttl is not None:
+            # Short-lived entries are never served stale; the next request re-renders
+            return None if age > ttl else (payload, mimetype, status, etag, False)
+        return payload, mimetype, status, etag, age > self.ttl
+
+    def set(self, key, payload, mimetype, status, ttl=None):
+        """Store a fully rendered response body, returning its ETag.
+
+        A `ttl` overrides the default freshness and drops the entry once it passes,
+        for responses that shouldn't outlive the condition that produced them.
+        """
+        # The ETag is computed once here so cache hits can answer If-None-Match for free
+        etag = hashlib.sha1(payload).hexdigest()
+        with self.lock:
+            self.entries[key] = (payload, mimetype, status, etag, time.monotonic(), ttl)
+        return etag
+
+    def capture(self, key, chunks, mimetype, status, ttl=None):
+        """Pass response chunks through, storing the joined body once fully sent"""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.set(key, b''.join(parts), mimetype, status, ttl)
+
+    def refresh(self, key, render):
+        """Re-render an entry in the background unless a refresh is already running.
+
+        `render` must return (payload, mimetype, status, ttl).
+        """
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def run():
+            try:
+                self.set(key, *render())
+                logger.debug("Refreshed cached response for %s", key)
+            except Exception as e:
+                logger.error(f"Error refreshing cached response for {key}: {e}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        self.executor.submit(run)
+
+    def clear(self):
+        """Drop all cached responses"""
+        with self.lock:
+            cleared = len(self.entries)
+            self.entries.clear()
+        return cleared
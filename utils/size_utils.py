@@ -3,20 +3,31 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Compiled once at import; this runs for every Nyaa page parsed
+SIZE_RE = re.compile(r"([\d\.]+)\s*(GiB|MiB|KiB|TiB|B)", re.I)
+UNIT_MULTIPLIERS = {
+    'b': 1,
+    'kib': 1024,
+    'mib': 1024**2,
+    'gib': 1024**3,
+    'tib': 1024**4
+}
+
 class SizeUtils:
-    def size_to_bytes(self, size_str):
+    @staticmethod
+    def size_to_bytes(size_str):
         """Parse size string like '1.23 GiB' into bytes"""
-        m = re.match(r"([\d\.]+)\s*(GiB|MiB|KiB|TiB|B)", size_str, re.I)
+        # Nyaa always writes "<number> <unit>", which splits faster than the regex runs
+        parts = size_str.split(' ')
+        if len(parts) == 2 and parts[0].replace('.', '', 1).isdecimal():
+            multiplier = UNIT_MULTIPLIERS.get(parts[1].lower())
+            if multiplier:
+                return int(float(parts[0]) * multiplier)
+        
+        m = SIZE_RE.match(size_str)
         if m:
             num, unit = m.groups()
             num = float(num)
             unit = unit.lower()
-            multipliers = {
-                'b': 1,
-                'kib': 1024,
-                'mib': 1024**2,
-                'gib': 1024**3,
-                'tib': 1024**4
-            }
-            return int(num * multipliers.get(unit, 1))
-        return 0
\ No newline at end of file
+            return int(num * UNIT_MULTIPLIERS.get(unit, 1))
+        return 0